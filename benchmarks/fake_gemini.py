@@ -0,0 +1,113 @@
+"""
+Stand-in for the google.generativeai SDK, for benchmarks.
+
+`install()` hands services.ai.gemini_service a fake SDK module, so the real
+SDK is never imported or contacted. Reply latency follows a log-normal
+distribution fitted to a median and a p99, and a fraction of calls can fail
+with a 429 to exercise the AI gateway's retries.
+"""
+import asyncio
+import math
+import random
+from types import SimpleNamespace
+from typing import List, Optional
+
+# z-score of the 99th percentile of a standard normal
+_Z99 = 2.326
+
+
+class LatencyModel:
+    def __init__(self, median: float = 0.8, p99: float = 3.0, seed: Optional[int] = None):
+        self.median = median
+        self.sigma = math.log(max(p99, median) / median) / _Z99 if median > 0 else 0.0
+        self._rng = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median * math.exp(self.sigma * self._rng.gauss(0, 1))
+
+
+class ResourceExhausted(Exception):
+    # Same name and code as google.api_core's 429, so the gateway retries it
+    code = 429
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=max(1, len(text) // 4),
+            total_token_count=prompt_tokens + max(1, len(text) // 4),
+        )
+
+
+class FakeStream:
+    def __init__(self, chunks: List[str], chunk_delay: float):
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for index, chunk in enumerate(self._chunks):
+            if index:
+                await asyncio.sleep(self._chunk_delay)
+            yield SimpleNamespace(text=chunk)
+
+
+REPLY = (
+    "That sounds really hard, and it makes sense that you feel this way. "
+    "Be gentle with yourself, take one small step today, and lean on someone you trust."
+)
+
+
+def _prompt_tokens(contents) -> int:
+    if isinstance(contents, str):
+        return max(1, len(contents) // 4)
+    return sum(max(1, len(part) // 4) for turn in contents for part in turn.get("parts", []))
+
+
+def make_sdk(latency: LatencyModel, error_rate: float = 0.0, chunk_delay: float = 0.02, seed: Optional[int] = None):
+    rng = random.Random(seed)
+    calls = {"count": 0, "errors": 0}
+
+    class GenerativeModel:
+        def __init__(self, model_name, system_instruction=None, generation_config=None):
+            self.model_name = model_name
+
+        async def generate_content_async(self, contents, stream: bool = False):
+            calls["count"] += 1
+            if rng.random() < error_rate:
+                await asyncio.sleep(latency.sample() / 10)
+                calls["errors"] += 1
+                raise ResourceExhausted("429 Resource has been exhausted (fake)")
+            await asyncio.sleep(latency.sample())
+            if stream:
+                words = REPLY.split(" ")
+                chunks = [" ".join(words[i:i + 6]) + " " for i in range(0, len(words), 6)]
+                return FakeStream(chunks, chunk_delay)
+            return FakeResponse(REPLY, _prompt_tokens(contents))
+
+    return SimpleNamespace(
+        GenerativeModel=GenerativeModel,
+        GenerationConfig=dict,
+        configure=lambda **kwargs: None,
+        calls=calls,
+    )
+
+
+def install(latency: LatencyModel, error_rate: float = 0.0, seed: Optional[int] = None):
+    """
+    Route every Gemini call in this process to a fake SDK; returns it.
+    """
+    from services.ai import gemini_service
+    from settings import settings
+
+    sdk = make_sdk(latency, error_rate=error_rate, seed=seed)
+    settings.gemini_api_key = settings.gemini_api_key or "benchmark"
+    gemini_service._genai = sdk
+    gemini_service._models.clear()
+    return sdk
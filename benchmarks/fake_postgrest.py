@@ -0,0 +1,430 @@
+"""
+In-process stand-in for Supabase's PostgREST API, for benchmarks.
+
+It is a plain ASGI app serving the `questions`, `responses`, `upvotes` and
+`comments` tables from memory, and is mounted under the real client with
+`client.open(transport=httpx.ASGITransport(app=db))`. It understands the
+subset of PostgREST the backend uses:
+
+- column filters (`eq`, `neq`, `gt`, `gte`, `lt`, `lte`, `in`, `is`) and
+  `or=(...)` / `and(...)` groups, as built by services.pagination
+- `order`, `limit`, `offset` and `select`, including embedded relations
+  such as `responses(*,upvotes(count),comments(*))` with `responses.order`
+  and `responses.limit`, aliases (`u0:upvotes(count)`) and filters on
+  embedded rows (`u0.created_at=gte.…`)
+- `Prefer: count=exact` and HEAD requests, answered in `Content-Range`
+- the single-object Accept header (406 unless exactly one row matches)
+- inserts, including `on_conflict` with `resolution=ignore-duplicates`
+"""
+import asyncio
+import random
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+import orjson
+
+TABLES = ("questions", "responses", "upvotes", "comments", "ai_replies")
+# (parent, child) -> foreign key on the child
+RELATIONS = {
+    ("questions", "responses"): "question_id",
+    ("questions", "ai_replies"): "question_id",
+    ("responses", "upvotes"): "response_id",
+    ("responses", "comments"): "response_id",
+}
+# Columns with a hash index; eq/in filters on them skip the table scan
+INDEXED = {"id", "question_id", "response_id"}
+_RESERVED = {"select", "order", "limit", "offset", "or", "and", "on_conflict", "columns"}
+TONES = ("advice", "just_listen", "encouragement")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, quoted, start = [], 0, False, 0
+    for index, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return [part for part in parts if part]
+
+
+# ---- filters -------------------------------------------------------------
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _compare(column: str, op: str, raw: str) -> Predicate:
+    if op == "in":
+        values = {_unquote(v) for v in _split_top_level(raw.strip("()"))}
+        return lambda row: _text(row.get(column)) in values
+    value = _unquote(raw)
+    if op == "is":
+        return lambda row: _text(row.get(column)) == value
+    checks = {
+        "eq": lambda a: a == value,
+        "neq": lambda a: a != value,
+        "gt": lambda a: a > value,
+        "gte": lambda a: a >= value,
+        "lt": lambda a: a < value,
+        "lte": lambda a: a <= value,
+    }
+    if op not in checks:
+        raise ValueError(f"Unsupported operator: {op}")
+    check = checks[op]
+    return lambda row: check(_text(row.get(column)))
+
+
+def _condition(text: str) -> Predicate:
+    """
+    One item of a logic group: `col.op.value`, `and(...)` or `or(...)`.
+    """
+    for group, combine in (("and(", all), ("or(", any)):
+        if text.startswith(group):
+            predicates = [_condition(part) for part in _split_top_level(text[len(group):-1])]
+            return lambda row, p=predicates, c=combine: c(pred(row) for pred in p)
+    column, op, value = text.split(".", 2)
+    return _compare(column, op, value)
+
+
+def _group(text: str, combine) -> Predicate:
+    predicates = [_condition(part) for part in _split_top_level(text.strip()[1:-1])]
+    return lambda row: combine(pred(row) for pred in predicates)
+
+
+# ---- select --------------------------------------------------------------
+
+def _parse_select(text: str) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Split a select into plain columns and embedded relations
+    (`alias:relation` or `relation` -> (relation, columns, embeds)).
+    """
+    columns, embeds = [], {}
+    for part in _split_top_level(text or "*"):
+        if "(" in part:
+            name, _, inner = part.partition("(")
+            # `alias:relation(...)` embeds `relation` under the key `alias`
+            relation = name.rpartition(":")[2]
+            embeds[name] = (relation, *_parse_select(inner[:-1]))
+        else:
+            columns.append(part)
+    return columns, embeds
+
+
+def _parse_order(text: Optional[str]) -> List[Tuple[str, bool]]:
+    order = []
+    for part in (text or "").split(","):
+        if part:
+            column, _, direction = part.partition(".")
+            order.append((column, direction.startswith("desc")))
+    return order
+
+
+class FakePostgREST:
+    """
+    Tables live in memory as lists kept sorted by (created_at, id), so the
+    keyset-ordered reads the backend makes need no sort. `latency` adds a
+    simulated network round-trip to every request.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {table: [] for table in TABLES}
+        self._index: Dict[Tuple[str, str], Dict[str, List[Dict[str, Any]]]] = {}
+        self._unique: Dict[Tuple[str, str], set] = defaultdict(set)
+        self.requests = 0
+        for table in TABLES:
+            for column in INDEXED:
+                self._index[(table, column)] = defaultdict(list)
+
+    # ---- data ----
+
+    def load(self, table: str, rows: List[Dict[str, Any]]):
+        rows = sorted(rows, key=lambda row: (row["created_at"], row["id"]))
+        self.tables[table] = rows
+        for column in INDEXED:
+            index = self._index[(table, column)] = defaultdict(list)
+            for row in rows:
+                if column in row:
+                    index[_text(row[column])].append(row)
+
+    def insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = dict(row)
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", _now())
+        rows = self.tables[table]
+        if rows and (row["created_at"], row["id"]) < (rows[-1]["created_at"], rows[-1]["id"]):
+            row["created_at"] = _now()
+        rows.append(row)
+        for column in INDEXED:
+            if column in row:
+                self._index[(table, column)][_text(row[column])].append(row)
+        return row
+
+    # ---- querying ----
+
+    def _candidates(self, table: str, filters: Dict[str, str]) -> List[Dict[str, Any]]:
+        # Use a hash index for the most selective eq/in filter available
+        for column, raw in filters.items():
+            if column in INDEXED:
+                op, _, value = raw.partition(".")
+                index = self._index[(table, column)]
+                if op == "eq":
+                    return index.get(value, [])
+                if op == "in":
+                    wanted = {_unquote(v) for v in _split_top_level(value.strip("()"))}
+                    matched = [row for key in wanted for row in index.get(key, [])]
+                    return sorted(matched, key=lambda row: (row["created_at"], row["id"]))
+        return self.tables[table]
+
+    def query(
+        self,
+        table: str,
+        params: List[Tuple[str, str]],
+        count: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        filters: Dict[str, str] = {}
+        logic: List[Predicate] = []
+        modifiers: Dict[str, Any] = {}
+        for key, value in params:
+            if key in ("or", "and"):
+                logic.append(_group(value, any if key == "or" else all))
+            elif "." in key and key.rpartition(".")[2] not in _RESERVED:
+                # A filter on embedded rows, e.g. `u0.created_at=gte.…`; repeats are ANDed
+                prefix, _, column = key.rpartition(".")
+                modifiers.setdefault(("filters", prefix), []).append(_compare(column, *value.split(".", 1)))
+            elif "." in key or key in _RESERVED:
+                modifiers[key] = value
+            else:
+                filters[key] = value
+        predicates = [_compare(column, *raw.split(".", 1)) for column, raw in filters.items()] + logic
+
+        order = _parse_order(modifiers.get("order"))
+        limit = int(modifiers["limit"]) if "limit" in modifiers else None
+        offset = int(modifiers.get("offset", 0))
+        rows = self._candidates(table, filters)
+        if order == [("created_at", True), ("id", True)]:
+            rows = reversed(rows)
+        elif order and order != [("created_at", False), ("id", False)]:
+            rows = list(rows)
+            for column, descending in reversed(order):
+                rows.sort(key=lambda row: _text(row.get(column)), reverse=descending)
+
+        matched, total = [], 0
+        stop = None if limit is None else offset + limit
+        for row in rows:
+            if all(pred(row) for pred in predicates):
+                total += 1
+                if stop is None or total <= stop:
+                    if total > offset:
+                        matched.append(row)
+                elif not count:
+                    break
+
+        columns, embeds = _parse_select(modifiers.get("select", "*"))
+        result = [self._shape(table, row, columns, embeds, modifiers, ()) for row in matched]
+        return result, (total if count else None)
+
+    def _shape(self, table, row, columns, embeds, modifiers, path) -> Dict[str, Any]:
+        if "*" in columns:
+            out = dict(row)
+        else:
+            out = {column: row.get(column) for column in columns}
+        for key, (name, sub_columns, sub_embeds) in embeds.items():
+            alias = key.partition(":")[0]
+            foreign_key = RELATIONS[(table, name)]
+            children = self._index[(name, foreign_key)].get(_text(row["id"]), [])
+            prefix = ".".join(path + (alias,))
+            predicates = modifiers.get(("filters", prefix))
+            if predicates:
+                children = [child for child in children if all(pred(child) for pred in predicates)]
+            if sub_columns == ["count"] and not sub_embeds:
+                out[alias] = [{"count": len(children)}]
+                continue
+            order = _parse_order(modifiers.get(f"{prefix}.order"))
+            if order and order[0][1]:
+                children = list(reversed(children))
+            limit = modifiers.get(f"{prefix}.limit")
+            if limit is not None:
+                children = children[: int(limit)]
+            out[alias] = [
+                self._shape(name, child, sub_columns, sub_embeds, modifiers, path + (alias,))
+                for child in children
+            ]
+        return out
+
+    # ---- ASGI ----
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+        table = scope["path"].rstrip("/").rsplit("/", 1)[-1]
+        params = parse_qsl(scope["query_string"].decode(), keep_blank_values=True)
+        try:
+            if table not in self.tables:
+                status, payload, extra = 404, {"message": f"relation {table} does not exist"}, {}
+            elif scope["method"] in ("GET", "HEAD"):
+                status, payload, extra = self._read(table, params, headers)
+            elif scope["method"] == "POST":
+                status, payload, extra = self._write(table, params, headers, body)
+            else:
+                status, payload, extra = 405, {"message": "Method not allowed"}, {}
+        except (ValueError, KeyError) as e:
+            status, payload, extra = 400, {"message": str(e)}, {}
+
+        content = b"" if payload is None or scope["method"] == "HEAD" else orjson.dumps(payload)
+        response_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())]
+        response_headers += [(key.encode(), value.encode()) for key, value in extra.items()]
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": content})
+
+    def _read(self, table, params, headers):
+        count = "count=exact" in headers.get("prefer", "")
+        rows, total = self.query(table, params, count=count)
+        offset = int(dict(params).get("offset", 0))
+        span = f"{offset}-{offset + len(rows) - 1}" if rows else "*"
+        extra = {"content-range": f"{span}/{total if count else '*'}"}
+        if "vnd.pgrst.object" in headers.get("accept", ""):
+            if len(rows) != 1:
+                return 406, {"message": "JSON object requested, multiple (or no) rows returned"}, {}
+            return 200, rows[0], extra
+        return (206 if count and total and len(rows) < total else 200), rows, extra
+
+    def _write(self, table, params, headers, body):
+        data = orjson.loads(body or b"null")
+        rows = data if isinstance(data, list) else [data]
+        prefer = headers.get("prefer", "")
+        conflict = dict(params).get("on_conflict")
+        inserted = []
+        for row in rows:
+            if conflict:
+                key = tuple(_text(row.get(column)) for column in conflict.split(","))
+                seen = self._unique[(table, conflict)]
+                if key in seen:
+                    if "ignore-duplicates" in prefer:
+                        continue
+                    return 409, {"message": "duplicate key value violates unique constraint"}, {}
+                seen.add(key)
+            inserted.append(self.insert(table, row))
+        if "return=minimal" in prefer:
+            return 201, None, {}
+        return 201, inserted, {}
+
+
+# ---- synthetic data -----------------------------------------------------
+
+WORDS = (
+    "anxiety work stress family friends sleep career school relationship partner confidence "
+    "motivation burnout lonely moving city money budget health therapy boundaries mother "
+    "sister breakup interview promotion exam study habits routine exercise self care worry "
+    "overwhelmed grief change decision future hope proud tired support advice listen"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "?"
+
+
+def seed(
+    db: FakePostgREST,
+    questions: int = 1000,
+    responses_per_question: int = 5,
+    upvotes_per_response: int = 8,
+    comments_per_response: int = 2,
+    users: int = 500,
+    days: float = 14,
+    random_seed: int = 1,
+):
+    """
+    Fill the fake database with reproducible synthetic data. Per-row counts
+    are drawn around the given means, with recent activity denser.
+    """
+    rng = random.Random(random_seed)
+    now = datetime.now(timezone.utc)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(users)]
+
+    def new_id() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def after(start: datetime) -> datetime:
+        span = (now - start).total_seconds()
+        return start + timedelta(seconds=span * rng.random() ** 2)
+
+    rows = {table: [] for table in TABLES}
+    for _ in range(questions):
+        asked = now - timedelta(days=days * rng.random())
+        question = {
+            "id": new_id(),
+            "user_id": rng.choice(user_ids),
+            "content": _sentence(rng, rng.randint(6, 25)),
+            "tone": rng.choice(TONES),
+            "created_at": asked.isoformat(timespec="microseconds"),
+        }
+        rows["questions"].append(question)
+        for _ in range(rng.randint(0, 2 * responses_per_question)):
+            answered = after(asked)
+            response = {
+                "id": new_id(),
+                "question_id": question["id"],
+                "user_id": rng.choice(user_ids),
+                "content": _sentence(rng, rng.randint(5, 40)),
+                "is_emoji": False,
+                "created_at": answered.isoformat(timespec="microseconds"),
+            }
+            rows["responses"].append(response)
+            voters = rng.sample(user_ids, min(users, int(rng.expovariate(1 / max(upvotes_per_response, 1e-9)))))
+            for voter in voters:
+                rows["upvotes"].append({
+                    "id": new_id(),
+                    "response_id": response["id"],
+                    "user_id": voter,
+                    "created_at": after(answered).isoformat(timespec="microseconds"),
+                })
+            for _ in range(rng.randint(0, 2 * comments_per_response)):
+                rows["comments"].append({
+                    "id": new_id(),
+                    "response_id": response["id"],
+                    "user_id": rng.choice(user_ids),
+                    "content": _sentence(rng, rng.randint(3, 15)),
+                    "created_at": after(answered).isoformat(timespec="microseconds"),
+                })
+    for table, table_rows in rows.items():
+        db.load(table, table_rows)
+    db._unique[("upvotes", "response_id,user_id")] = {
+        (row["response_id"], row["user_id"]) for row in rows["upvotes"]
+    }
+    return user_ids
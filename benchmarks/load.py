@@ -0,0 +1,293 @@
+"""
+Load-test the backend in-process against fake Supabase and Gemini.
+
+    python benchmarks/load.py --workload feed --users 50 --duration 15
+    python benchmarks/load.py --workload all --json benchmarks/results/$(git rev-parse --short HEAD).json
+    python benchmarks/load.py --workload feed --compare benchmarks/results/<old>.json
+
+The real app (middleware, caches, buffers, background tasks) runs under
+httpx.ASGITransport. Supabase is benchmarks.fake_postgrest seeded with
+synthetic data, and Gemini is benchmarks.fake_gemini. Virtual users loop
+through their workload back to back for `--duration` seconds after a warm-up.
+The report gives per-route p50/p95/p99 latency and requests per second.
+
+Everything shares one event loop, so the fakes' CPU time counts against the
+app. Compare runs made with the same options on the same machine.
+
+Workloads:
+  feed     browse the question feed, open threads, read responses and counts
+  upvotes  many users upvoting a small set of hot responses
+  chat     multi-turn chat sessions plus one-shot AI replies
+  all      a mix of the three
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Settings are read at import, so point them at the fakes first
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+# Keep the report readable: only warnings and errors, and on stderr (see run())
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+from benchmarks.fake_gemini import LatencyModel, install as install_fake_gemini  # noqa: E402
+from benchmarks.fake_postgrest import WORDS, FakePostgREST, seed  # noqa: E402
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    async def call(self, label: str, request) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            res = await request
+        except Exception:
+            res = None
+        elapsed = time.perf_counter() - start
+        if self.recording:
+            self.samples[label].append(elapsed)
+            if res is None or res.status_code >= 400:
+                self.errors[label] += 1
+        return res
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        routes = {}
+        everything = []
+        for label, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            everything.extend(ordered)
+            routes[label] = self._row(ordered, self.errors[label], elapsed)
+        routes["TOTAL"] = self._row(sorted(everything), sum(self.errors.values()), elapsed)
+        return routes
+
+    @staticmethod
+    def _row(ordered: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+        return {
+            "requests": len(ordered),
+            "errors": errors,
+            "rps": round(len(ordered) / elapsed, 1),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        }
+
+
+def _hot(rng: random.Random, items: List[Any], skew: float = 1.2) -> Any:
+    # Zipf-like pick: low indexes (the newest rows) are much more popular
+    return items[min(len(items) - 1, int(rng.paretovariate(skew)) - 1)]
+
+
+async def feed_user(api: httpx.AsyncClient, rec: Recorder, rng: random.Random, ctx: Dict[str, Any]):
+    res = await rec.call("GET /questions", api.get("/questions", params={"limit": 20}))
+    if res is not None and res.status_code == 200 and rng.random() < 0.3:
+        cursor = res.json().get("next_cursor")
+        if cursor:
+            await rec.call("GET /questions?cursor", api.get("/questions", params={"limit": 20, "cursor": cursor}))
+    if rng.random() < 0.2:
+        tone = rng.choice(("advice", "just_listen", "encouragement"))
+        await rec.call("GET /questions?tone", api.get("/questions", params={"tone": tone}))
+
+    question_id = _hot(rng, ctx["question_ids"])
+    res = await rec.call("GET /questions/{id}/thread", api.get(f"/questions/{question_id}/thread"))
+    response_ids = []
+    if res is not None and res.status_code == 200:
+        response_ids = [response["id"] for response in res.json().get("responses") or []]
+    if rng.random() < 0.3:
+        await rec.call("GET /questions/{id}/responses", api.get(f"/questions/{question_id}/responses"))
+    if response_ids:
+        await rec.call(
+            "GET /upvotes/counts", api.get("/upvotes/counts", params={"response_ids": ",".join(response_ids)})
+        )
+        if rng.random() < 0.3:
+            await rec.call("GET /responses/{id}/comments", api.get(f"/responses/{rng.choice(response_ids)}/comments"))
+    if rng.random() < 0.1:
+        await rec.call("GET /trending", api.get("/trending"))
+    if rng.random() < 0.1:
+        query = " ".join(rng.sample(WORDS, 2))
+        await rec.call("GET /search", api.get("/search", params={"q": query[: rng.randint(3, len(query))]}))
+
+
+async def upvote_user(api: httpx.AsyncClient, rec: Recorder, rng: random.Random, ctx: Dict[str, Any]):
+    response_id = _hot(rng, ctx["hot_response_ids"], skew=1.05)
+    user_id = f"storm-{rng.getrandbits(40):x}"
+    await rec.call(
+        "POST /responses/{id}/upvote",
+        api.post(f"/responses/{response_id}/upvote", json={"response_id": response_id, "user_id": user_id}),
+    )
+    if rng.random() < 0.2:
+        await rec.call("GET /responses/{id}/upvotes", api.get(f"/responses/{response_id}/upvotes"))
+
+
+async def chat_user(api: httpx.AsyncClient, rec: Recorder, rng: random.Random, ctx: Dict[str, Any]):
+    session_id = None
+    for turn in range(rng.randint(2, 6)):
+        message = f"{' '.join(rng.sample(WORDS, 8))} ({rng.getrandbits(32):x})"
+        res = await rec.call(
+            "POST /chatbot/chat", api.post("/chatbot/chat", json={"message": message, "session_id": session_id})
+        )
+        if res is not None and res.status_code == 200:
+            session_id = res.json()["session_id"]
+    if rng.random() < 0.5:
+        # A small prompt set, so some one-shot replies hit the completion cache
+        question = f"How do I deal with {rng.choice(WORDS[:20])}?"
+        await rec.call("POST /generate-response", api.post("/generate-response", json={"question": question}))
+
+
+WORKLOADS = {"feed": feed_user, "upvotes": upvote_user, "chat": chat_user}
+
+
+async def _virtual_user(workload, api, rec, rng, ctx, deadline: float, think: float):
+    while time.perf_counter() < deadline:
+        await workload(api, rec, rng, ctx)
+        # Requests served from memory never yield over ASGITransport; without a real
+        # network in between, one user could otherwise hold the loop indefinitely
+        await asyncio.sleep(rng.expovariate(1 / think) if think else 0)
+
+
+async def run(args) -> Dict[str, Any]:
+    import main
+    from services.log import log_pipeline
+    from supabase_client import client as supabase
+
+    log_pipeline.stream = sys.stderr
+
+    db = FakePostgREST(latency=args.db_latency_ms / 1000)
+    seed(
+        db,
+        questions=args.questions,
+        responses_per_question=args.responses_per_question,
+        upvotes_per_response=args.upvotes_per_response,
+        comments_per_response=args.comments_per_response,
+        users=args.users_in_db,
+        random_seed=args.seed,
+    )
+    newest_first = list(reversed(db.tables["questions"]))
+    responses = list(reversed(db.tables["responses"]))
+    ctx = {
+        "question_ids": [row["id"] for row in newest_first],
+        "hot_response_ids": [row["id"] for row in responses[:50]] or ["missing"],
+    }
+    sdk = install_fake_gemini(
+        LatencyModel(args.gemini_median_ms / 1000, args.gemini_p99_ms / 1000, seed=args.seed),
+        error_rate=args.gemini_error_rate,
+        seed=args.seed,
+    )
+
+    # Open the Supabase client on the fake before the lifespan does
+    await supabase.open(transport=httpx.ASGITransport(app=db))
+    rec = Recorder()
+    workloads = list(WORKLOADS.values()) if args.workload == "all" else [WORKLOADS[args.workload]]
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        limits = httpx.Limits(max_connections=None)
+        async with httpx.AsyncClient(transport=transport, base_url="http://askher", limits=limits) as api:
+            start = time.perf_counter()
+            deadline = start + args.warmup + args.duration
+            users = [
+                _virtual_user(workloads[i % len(workloads)], api, rec, random.Random(args.seed * 1000 + i), ctx,
+                              deadline, args.think_ms / 1000)
+                for i in range(args.users)
+            ]
+            tasks = [asyncio.ensure_future(user) for user in users]
+            await asyncio.sleep(args.warmup)
+            rec.recording = True
+            measured_from = time.perf_counter()
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - measured_from
+
+    return {
+        "commit": _git_commit(),
+        "options": vars(args),
+        "elapsed_seconds": round(elapsed, 2),
+        "upstream": {"supabase_requests": db.requests, "gemini_calls": sdk.calls["count"]},
+        "routes": rec.report(elapsed),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"commit {result['commit']}  workload {result['options']['workload']}  "
+          f"users {result['options']['users']}  {result['elapsed_seconds']}s  upstream {result['upstream']}")
+    header = f"{'route':34} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    old_routes = (baseline or {}).get("routes", {})
+    for label, row in result["routes"].items():
+        line = (f"{label:34} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8} "
+                f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+        old = old_routes.get(label)
+        if old:
+            line += "   vs baseline: " + "  ".join(
+                f"{key} {_delta(old[key], row[key])}" for key in ("rps", "p50_ms", "p99_ms")
+            )
+        print(line)
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", choices=[*WORKLOADS, "all"], default="feed")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=15, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds run before measuring")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between iterations per user")
+    parser.add_argument("--questions", type=int, default=2000, help="seeded questions")
+    parser.add_argument("--responses-per-question", type=int, default=5)
+    parser.add_argument("--upvotes-per-response", type=int, default=8)
+    parser.add_argument("--comments-per-response", type=int, default=2)
+    parser.add_argument("--users-in-db", type=int, default=1000, help="distinct seeded user ids")
+    parser.add_argument("--db-latency-ms", type=float, default=2, help="simulated Supabase round-trip")
+    parser.add_argument("--gemini-median-ms", type=float, default=800)
+    parser.add_argument("--gemini-p99-ms", type=float, default=3000)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="fraction of Gemini calls that 429")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, baseline)
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measure how fast a backend worker starts.
+
+    python benchmarks/startup.py [--runs 5]
+
+Reports, over several fresh interpreters:
+- cold import time of `main` and whether the Gemini SDK was imported by it
+- time from spawning `uvicorn main:app` until `GET /` answers
+
+Supabase and Gemini are never contacted: SUPABASE_URL points at a closed
+local port and the real keys are not needed.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "gemini_sdk_loaded": "google.generativeai" in sys.modules}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    env.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import():
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_request(timeout: float = 30.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as res:
+                    if res.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("Server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _summary(samples):
+    return f"median {statistics.median(samples) * 1000:.0f} ms, min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    print(f"import main:        {_summary([run['seconds'] for run in imports])}")
+    print(f"Gemini SDK loaded:  {any(run['gemini_sdk_loaded'] for run in imports)}")
+    first = [measure_first_request() for _ in range(args.runs)]
+    print(f"first request:      {_summary(first)}")
+
+
+if __name__ == "__main__":
+    main()
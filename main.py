@@ -1,11 +1,77 @@
-from fastapi import FastAPI
+import asyncio
+import math
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routes.questions import router as questions_router
 from routes.responses import router as responses_router
 from routes.ai import router as ai_router
 from routes.chatbot import router as chatbot_router
+from routes.search import router as search_router
+from routes.dashboard import router as dashboard_router
+from settings import settings
+from supabase_client import SupabaseUnavailable, client as supabase
+from services.ai import gemini_service
+from services.ai.completion_cache import completion_cache
+from services.ai.sessions import chat_sessions
+from services.ai.gateway import AIOverloaded, ai_gateway
+from services.ai.pregeneration import ai_replies
+from services.ai.jobs import ai_jobs
+from services.trending import trending, run_reconciler
+from services.upvote_buffer import upvote_buffer
+from services.search import search_index, build_index
+from services.facets import tone_facets, run_reconciler as run_facet_reconciler
+from middleware.conditional import ConditionalGetMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.request_id import RequestIdMiddleware
+from services.log import get_logger, log_pipeline
+from services.metrics import METRICS_DIR, cache_hits, cache_misses, metrics, run_writer as run_metrics_writer
 
-app = FastAPI()
+logger = get_logger("app")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Log records are written by a background thread, never by request handlers
+    log_pipeline.start()
+    # Open the pooled Supabase client once per worker and close it on shutdown
+    if not settings.supabase_url:
+        logger.warning("SUPABASE_URL is not set; Supabase requests will fail")
+    await supabase.open()
+    if not settings.ai_configured:
+        logger.warning("GEMINI_API_KEY is not set; AI routes will answer 503")
+    elif settings.ai_eager_startup:
+        gemini_service.warm_up()
+    upvote_buffer.start()
+    ai_replies.start()
+    # Keep the trending index reconciled with Supabase in the background
+    reconciler = asyncio.create_task(run_reconciler(trending, supabase))
+    facet_reconciler = asyncio.create_task(run_facet_reconciler(tone_facets, supabase))
+    # Load the search index without holding up startup
+    indexer = asyncio.create_task(build_index(search_index, supabase))
+    # With several workers, each one publishes its metrics for /metrics to merge
+    metrics_writer = asyncio.create_task(run_metrics_writer(metrics)) if METRICS_DIR else None
+    try:
+        yield
+    finally:
+        if metrics_writer is not None:
+            metrics_writer.cancel()
+            metrics.write()
+        await ai_replies.stop()
+        await ai_jobs.stop()
+        reconciler.cancel()
+        facet_reconciler.cancel()
+        indexer.cancel()
+        await asyncio.gather(reconciler, facet_reconciler, indexer, return_exceptions=True)
+        # Drain buffered upvotes while the Supabase client is still open
+        await upvote_buffer.stop()
+        await supabase.close()
+        chat_sessions.close()
+        # Last, so records from the shutdown steps above are written out
+        log_pipeline.stop()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -18,16 +84,100 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Request-ID"],
 )
 
+# Browser/CDN caching per route template; every GET also gets an ETag for 304 revalidation
+CACHE_POLICIES = {
+    "/questions": "public, max-age=5, stale-while-revalidate=30",
+    "/questions/facets": "public, max-age=30",
+    "/questions/{id}": "public, max-age=30",
+    "/questions/{id}/thread": "public, max-age=5, stale-while-revalidate=30",
+    "/questions/{id}/ai-reply": "no-cache",
+    "/questions/{question_id}/responses": "public, max-age=5, stale-while-revalidate=30",
+    "/responses/{id}": "public, max-age=30",
+    "/responses/{id}/comments": "public, max-age=5",
+    "/responses/{id}/upvotes": "public, max-age=5",
+    "/upvotes/counts": "public, max-age=5",
+    "/trending": "public, max-age=30, stale-while-revalidate=60",
+    "/search": "public, max-age=5",
+    "/my/questions": "private, no-cache",
+    "/my/responses": "private, no-cache",
+    "/my/dashboard": "private, no-cache",
+    "/cache/stats": "no-store",
+    "/health": "no-store",
+    "/metrics": "no-store",
+}
+
+app.add_middleware(ConditionalGetMiddleware, policies=CACHE_POLICIES)
+# Outside the ETag middleware, so ETags are computed on the uncompressed body
+app.add_middleware(CompressionMiddleware)
+# Outside the others, so latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the request id is set for everything logged while serving a request
+app.add_middleware(RequestIdMiddleware)
+
+@app.exception_handler(AIOverloaded)
+@app.exception_handler(SupabaseUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: Exception):
+    # Shed load quickly instead of letting requests pile up behind a slow upstream
+    return ORJSONResponse(
+        status_code=503,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
 @app.get("/")
 def root():
     return {"message": "Backend is running"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "supabase": supabase.cache.stats(),
+        "upvote_buffer": upvote_buffer.stats(),
+        "ai": completion_cache.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "ai_gateway": ai_gateway.stats(),
+        "ai_pregeneration": ai_replies.stats(),
+        "ai_jobs": ai_jobs.stats(),
+        "search": search_index.stats(),
+        "logging": log_pipeline.stats(),
+    }
+
+# Always 200 while the process is up, so a Supabase outage does not take every worker
+# out of the load balancer; `status` is "degraded" while the breaker is not closed
+@app.get("/health")
+async def health():
+    database = supabase.health()
+    return {
+        "status": "ok" if database["state"] == "closed" else "degraded",
+        "supabase": database,
+        "ai": {"configured": settings.ai_configured, **ai_gateway.stats()},
+    }
+
+def collect_cache_metrics():
+    # The caches keep their own counters; mirror them so /metrics can derive hit ratios
+    for name, cache in (("supabase", supabase.cache), ("ai_completions", completion_cache)):
+        stats = cache.stats()
+        cache_hits.labels(name).set(stats["hits"])
+        cache_misses.labels(name).set(stats["misses"])
+
+metrics.add_collector(collect_cache_metrics)
+
+# async, like /cache/stats and /health: reading the stats on a threadpool thread
+# would race the event loop adding label children and counters. Only the other
+# workers' snapshot files are read in a thread.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(await metrics.render_async(), media_type="text/plain; version=0.0.4")
+
 app.include_router(questions_router, tags=["Questions"])
 app.include_router(responses_router, tags=["Responses"])
 app.include_router(ai_router, tags=["AI"])
 app.include_router(chatbot_router, prefix="/chatbot", tags=["Chatbot"])
+app.include_router(search_router, tags=["Search"])
+app.include_router(dashboard_router, tags=["Dashboard"])
 
 
         
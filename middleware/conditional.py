@@ -0,0 +1,121 @@
+import hashlib
+from typing import Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Bodies larger than this are streamed through untouched instead of buffered for hashing
+MAX_ETAG_BODY_BYTES = 2 * 1024 * 1024
+
+# Suffixes the compression middleware adds to the ETag of encoded representations
+_ENCODING_SUFFIXES = ('-br"', '-gzip"')
+
+# Scope key holding the size of the body a 304 stands in for, so the compression
+# middleware can give the 304 the same ETag and Vary as the full response
+NOT_MODIFIED_SIZE = "askher.not_modified_size"
+
+
+def compute_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for suffix in _ENCODING_SUFFIXES:
+            if candidate.endswith(suffix):
+                candidate = candidate[: -len(suffix)] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
+
+
+class ConditionalGetMiddleware:
+    """
+    Add a strong ETag to successful GET responses and answer a matching
+    If-None-Match with 304 Not Modified.
+
+    The ETag is a hash of the response bytes, so it needs no bookkeeping in the
+    routes. Each route template can also be given a Cache-Control policy; routes
+    without one get `default_policy`.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        policies: Optional[Dict[str, str]] = None,
+        default_policy: Optional[str] = "no-cache",
+    ):
+        self.app = app
+        self.policies = policies or {}
+        self.default_policy = default_policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Optional[Message] = None
+        chunks = []
+        size = 0
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start = message
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if message["status"] != 200 or content_type.startswith("text/event-stream"):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if message.get("more_body", False):
+                if size > MAX_ETAG_BODY_BYTES:
+                    # Too large to hash in memory; stream the rest without an ETag
+                    passthrough = True
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            etag = headers.get("etag") or compute_etag(body)
+            headers["ETag"] = etag
+            policy = self._policy_for(scope)
+            if policy and "cache-control" not in headers:
+                headers["Cache-Control"] = policy
+
+            if if_none_match and etag_matches(if_none_match, etag):
+                scope[NOT_MODIFIED_SIZE] = len(body)
+                del headers["content-length"]
+                if "content-type" in headers:
+                    del headers["content-type"]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _policy_for(self, scope: Scope) -> Optional[str]:
+        route = scope.get("route")
+        path = getattr(route, "path", None)
+        return self.policies.get(path, self.default_policy)
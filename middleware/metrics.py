@@ -0,0 +1,43 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from services.metrics import http_in_flight, http_request_duration, http_requests
+
+
+class MetricsMiddleware:
+    """
+    Record request count, latency and in-flight requests per route template.
+
+    The template (e.g. `/questions/{id}`) is read from the matched route after
+    the app has run, so label cardinality stays bounded; requests that match
+    no route are labelled `unmatched`. Latency runs until the last body chunk
+    is sent, which for event streams is the whole stream.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._in_flight = http_in_flight.labels()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self._in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.labels(method, template).observe(time.perf_counter() - start)
+            http_requests.labels(method, template, str(status)).inc()
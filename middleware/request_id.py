@@ -0,0 +1,58 @@
+import re
+import time
+import uuid
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from services.log import get_logger, log_success, request_id
+
+# Ids accepted from a caller or proxy; anything else is replaced with a fresh one
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+logger = get_logger("http")
+
+
+class RequestIdMiddleware:
+    """
+    Give every request an id, echoed in the X-Request-ID response header and
+    attached to every log record written while serving it.
+
+    An incoming X-Request-ID (e.g. from a load balancer) is reused when it looks
+    sane. One access record is logged per request: always for 5xx responses,
+    and for a sample of the rest.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get("x-request-id")
+        rid = incoming if incoming and _VALID_REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+        token = request_id.set(rid)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", rid)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            fields = {
+                "method": scope["method"],
+                "route": getattr(scope.get("route"), "path", "unmatched"),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+            if status >= 500:
+                logger.warning("request failed", extra=fields)
+            else:
+                log_success(logger, "request", **fields)
+            request_id.reset(token)
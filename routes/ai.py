@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
-from services.ai.gemini_service import generate_supportive_response
+from services.ai.gemini_service import generate_reply, generate_supportive_response, stream_supportive_response
+from services.ai.streaming import sse_response
+from services.ai.gateway import AIOverloaded
+from services.ai.disconnect import cancel_on_disconnect
+from services.ai.jobs import ai_jobs
 
 router = APIRouter()
 
@@ -10,16 +14,42 @@ class AIRequest(BaseModel):
     tone: Optional[str] = "supportive"
 
 @router.post("/generate-response")
-async def generate_response(request: AIRequest):
+async def generate_response(request: AIRequest, http_request: Request):
     try:
-        response = await generate_supportive_response(
-            question=request.question,
-            tone=request.tone
+        response = await cancel_on_disconnect(
+            http_request,
+            generate_supportive_response(request.question, tone=request.tone),
         )
         return {"response": response}
+    except (AIOverloaded, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate AI response: {str(e)}"
         )
 
+# Same as /generate-response, streamed as Server-Sent Events
+@router.post("/generate-response/stream")
+async def generate_response_stream(request: AIRequest):
+    return await sse_response(stream_supportive_response(request.question, tone=request.tone))
+
+# Start a generation in the background and poll for its result
+@router.post("/ai/jobs", status_code=202)
+async def create_ai_job(request: AIRequest):
+    job = ai_jobs.submit("generate", lambda: generate_reply(request.question, tone=request.tone))
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/ai/jobs/{job_id}")
+async def get_ai_job(job_id: str):
+    job = ai_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.delete("/ai/jobs/{job_id}")
+async def cancel_ai_job(job_id: str):
+    job = ai_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
-from services.ai.gemini_service import chat_with_ai
+from services.ai.gemini_service import chat_with_ai, stream_chat_with_ai
+from services.ai.streaming import sse_response
+from services.ai.gateway import AIOverloaded
+from services.ai.disconnect import cancel_on_disconnect
 import uuid
 
 router = APIRouter()
@@ -15,20 +18,31 @@ class ChatResponse(BaseModel):
     session_id: str
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage, request: Request):
     try:
         # Generate a new session ID if one wasn't provided
         session_id = message.session_id or str(uuid.uuid4())
         
         # Get response from AI
-        response = await chat_with_ai(session_id, message.message)
+        response = await cancel_on_disconnect(request, chat_with_ai(session_id, message.message))
         
         return ChatResponse(
             response=response,
             session_id=session_id
         )
+    except (AIOverloaded, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process chat message: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+# Same as /chat, streamed as Server-Sent Events; the final `done` event has the ChatResponse fields
+@router.post("/chat/stream")
+async def chat_stream(message: ChatMessage):
+    session_id = message.session_id or str(uuid.uuid4())
+    return await sse_response(
+        stream_chat_with_ai(session_id, message.message),
+        metadata={"session_id": session_id},
+    )
@@ -0,0 +1,85 @@
+import asyncio
+import os
+from fastapi import APIRouter, Query
+from typing import Any, Awaitable, Dict
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_params, paginate
+from services.upvote_buffer import upvote_buffer
+from supabase_client import client, total_count
+
+router = APIRouter()
+
+# Seconds each dashboard sub-query may take before it is reported as failed
+DASHBOARD_TIMEOUT_SECONDS = float(os.getenv("DASHBOARD_TIMEOUT_SECONDS", "3"))
+
+
+class SubQueryError(Exception):
+    pass
+
+
+async def _my_questions(user_id: str, limit: int) -> Dict[str, Any]:
+    params = {"user_id": f"eq.{user_id}", "select": "*", **keyset_params(limit)}
+    res = await client.get("/questions", params=params)
+    if res.status_code != 200:
+        raise SubQueryError(res.text)
+    return paginate(res.json(), limit)
+
+
+async def _my_responses(user_id: str, limit: int) -> Dict[str, Any]:
+    # Upvote and comment counts come embedded, in the same round-trip
+    params = {
+        "user_id": f"eq.{user_id}",
+        "select": "*,upvotes(count),comments(count)",
+        **keyset_params(limit),
+    }
+    res = await client.get("/responses", params=params)
+    if res.status_code != 200:
+        raise SubQueryError(res.text)
+    rows = res.json()
+    for row in rows:
+        upvotes = row.pop("upvotes", None) or []
+        comments = row.pop("comments", None) or []
+        row["upvote_count"] = (upvotes[0]["count"] if upvotes else 0) + upvote_buffer.pending_count(row["id"])
+        row["comment_count"] = comments[0]["count"] if comments else 0
+    return paginate(rows, limit)
+
+
+async def _count(table: str, user_id: str) -> int:
+    res = await client.count(f"/{table}", params={"user_id": f"eq.{user_id}"})
+    total = total_count(res)
+    if res.status_code not in (200, 206) or total is None:
+        raise SubQueryError(f"Failed to count {table} (status {res.status_code})")
+    return total
+
+
+async def _bounded(call: Awaitable[Any]) -> Any:
+    try:
+        return await asyncio.wait_for(call, timeout=DASHBOARD_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise SubQueryError(f"Timed out after {DASHBOARD_TIMEOUT_SECONDS:g}s")
+
+
+# everything a profile page needs, fetched concurrently
+@router.get("/my/dashboard")
+async def get_my_dashboard(
+    user_id: str = Query(...),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    calls = {
+        "questions": _my_questions(user_id, limit),
+        "responses": _my_responses(user_id, limit),
+        "question_count": _count("questions", user_id),
+        "response_count": _count("responses", user_id),
+    }
+    results = await asyncio.gather(*(_bounded(call) for call in calls.values()), return_exceptions=True)
+
+    # A failed section is null and explained under "errors"; the rest is still returned
+    dashboard: Dict[str, Any] = {"user_id": user_id}
+    errors: Dict[str, str] = {}
+    for name, result in zip(calls, results):
+        if isinstance(result, Exception):
+            dashboard[name] = None
+            errors[name] = str(result) or type(result).__name__
+        else:
+            dashboard[name] = result
+    dashboard["errors"] = errors
+    return dashboard
@@ -1,40 +1,157 @@
 from fastapi import APIRouter, Request, Path, Query, HTTPException
-from supabase_client import client
-from typing import List
-from schemas.models import QuestionCreate
+from supabase_client import client, error_code
+from typing import List, Optional
+from schemas.models import QuestionCreate, Tone
+from services.facets import FACETS_RETRY_SECONDS, tone_facets, ensure_ready as ensure_facets
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, keyset_params, paginate_response
+from services.upvote_buffer import upvote_buffer
+from services.ai.pregeneration import AI_REPLY_COLUMNS, ai_replies, ai_reply_from_row
+from services.search import search_index
+from services.passthrough import SINGLE_OBJECT_HEADERS, passthrough
+from services.log import get_logger, log_success
 
 
 router = APIRouter()
+logger = get_logger("questions")
+
+# Seconds a cached question list stays fresh; writes invalidate it sooner
+QUESTIONS_CACHE_TTL = 10
 
 @router.get("/questions")
-def get_questions():
-    res = client.get("/questions?select=*")
+async def get_questions(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    tone: Optional[Tone] = None,
+):
+    params = {"select": "*", **keyset_params(limit, cursor)}
+    if tone:
+        params["tone"] = f"eq.{tone}"
+    res = await client.get(
+        "/questions", params=params, cache_ttl=QUESTIONS_CACHE_TTL, cache_tags=("questions",)
+    )
     if res.status_code != 200:
         return {"error": res.text}
-    return res.json()
+    return paginate_response(res, limit)
+
+# question counts per tone, from in-memory counters
+@router.get("/questions/facets")
+async def get_question_facets():
+    # First calls before the background reconcile finished seed the counters;
+    # until that works there are no counts to report, rather than zeros
+    if not await ensure_facets(tone_facets, client):
+        raise HTTPException(
+            status_code=503,
+            detail="Question counts are not available yet.",
+            headers={"Retry-After": str(FACETS_RETRY_SECONDS)},
+        )
+    return tone_facets.counts()
 
 @router.get("/questions/{id}")
-def get_question_by_id(id: str):
-    res = client.get(f"/questions?id=eq.{id}&select=*")
+async def get_question_by_id(id: str):
+    res = await client.get(f"/questions?id=eq.{id}&select=*", headers=SINGLE_OBJECT_HEADERS)
+    if res.status_code == 406:
+        return {"error": "Question not found"}
+    if res.status_code != 200:
+        return {"error": res.text}
+    return passthrough(res)
+
+def thread_select(depth: int, ai_reply: bool = True) -> str:
+    """
+    Build the embedded PostgREST select for a question thread.
+    depth 0 is the question alone, 1 adds responses with upvote counts, 2 adds comments.
+    """
+    # The stored AI reply rides along at every depth
+    fields = f"*,ai_replies({AI_REPLY_COLUMNS})" if ai_reply else "*"
+    if depth == 0:
+        return fields
+    response_fields = "*,upvotes(count)"
+    if depth >= 2:
+        response_fields += ",comments(*)"
+    return f"{fields},responses({response_fields})"
+
+# question with its responses, comments and upvote counts in one round-trip
+@router.get("/questions/{id}/thread")
+async def get_question_thread(
+    id: str,
+    depth: int = Query(2, ge=0, le=2),
+    responses_limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    comments_limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    embed_ai_reply = ai_replies.embed_ai_reply()
+    params = {"id": f"eq.{id}", "select": thread_select(depth, embed_ai_reply)}
+    if depth >= 1:
+        params["responses.order"] = "created_at.desc,id.desc"
+        params["responses.limit"] = str(responses_limit)
+    if depth >= 2:
+        params["responses.comments.order"] = "created_at.asc,id.asc"
+        params["responses.comments.limit"] = str(comments_limit)
+
+    res = await client.get("/questions", params=params)
+    if embed_ai_reply and res.status_code == 400 and error_code(res) == "PGRST200":
+        # No ai_replies relationship yet (migration not applied); serve the thread without it
+        ai_replies.embed_missing()
+        embed_ai_reply = False
+        params["select"] = thread_select(depth, embed_ai_reply)
+        res = await client.get("/questions", params=params)
     if res.status_code != 200:
         return {"error": res.text}
     data = res.json()
     if not data:
         return {"error": "Question not found"}
-    return data[0]
 
-@router.post("/questions")
-def create_question(question: QuestionCreate):
-    res = client.post("/questions", json=question.dict())
+    question = data[0]
+    if depth >= 1:
+        responses = question.get("responses") or []
+        for response in responses:
+            upvotes = response.pop("upvotes", None) or []
+            response["upvote_count"] = (
+                (upvotes[0]["count"] if upvotes else 0) + upvote_buffer.pending_count(response["id"])
+            )
+            if depth >= 2:
+                comments = response.get("comments") or []
+                # cursors continue on /responses/{id}/comments and /questions/{id}/responses
+                response["comments_next_cursor"] = (
+                    encode_cursor(comments[-1]) if len(comments) >= comments_limit else None
+                )
+        question["responses_next_cursor"] = (
+            encode_cursor(responses[-1]) if len(responses) >= responses_limit else None
+        )
+    if embed_ai_reply:
+        stored = ai_reply_from_row(id, question.pop("ai_replies", None))
+        question["ai_reply"] = stored or ai_replies.get(id)
+    else:
+        question["ai_reply"] = await ai_replies.load(id)
+    return question
 
-    print("Supabase status:", res.status_code)
-    print("Supabase text:", res.text)
+# pre-generated AI reply for a question
+@router.get("/questions/{id}/ai-reply")
+async def get_ai_reply(id: str):
+    reply = await ai_replies.load(id)
+    if reply is not None:
+        return reply
+    if ai_replies.is_pending(id):
+        return {"status": "pending"}
+    return {"error": "AI reply not found"}
+
+@router.post("/questions")
+async def create_question(question: QuestionCreate):
+    res = await client.post("/questions", json=question.dict())
 
     if res.status_code != 201:
+        logger.warning("question insert failed", extra={"status": res.status_code, "code": error_code(res)})
         raise HTTPException(status_code=500, detail=res.text)
 
+    client.invalidate("questions")
+
     if res.text.strip():
-        return res.json()
+        data = res.json()
+        # Queue an AI reply in the background; this never delays the response
+        for row in data if isinstance(data, list) else [data]:
+            search_index.add_question(row)
+            tone_facets.record(row.get("tone"))
+            ai_replies.submit(row)
+            log_success(logger, "question created", question_id=row.get("id"), tone=row.get("tone"))
+        return data
     else:
         return {
             "message": "Question created successfully.",
@@ -42,10 +159,17 @@ def create_question(question: QuestionCreate):
             }
 
 @router.get("/my/questions")
-def get_my_questions(user_id: str = Query(...)):
-    res = client.get(f"/questions?user_id=eq.{user_id}&select=*")
+async def get_my_questions(
+    user_id: str = Query(...),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    tone: Optional[Tone] = None,
+):
+    params = {"user_id": f"eq.{user_id}", "select": "*", **keyset_params(limit, cursor)}
+    if tone:
+        params["tone"] = f"eq.{tone}"
+    res = await client.get("/questions", params=params)
     if res.status_code != 200:
         return {"error": res.text}
-    return res.json()
-
+    return paginate_response(res, limit)
 
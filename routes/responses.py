@@ -1,108 +1,187 @@
-from fastapi import APIRouter, Request, Path, Query
-from supabase_client import client
-
-router = APIRouter()
-
-from fastapi import APIRouter, Request, Path, Query
+from fastapi import APIRouter, Request, Path, Query, HTTPException
+from typing import Optional
+import uuid
 from schemas.models import ResponseCreate, CommentCreate, UpvoteCreate
-from supabase_client import client
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_params, paginate_response
+from services.passthrough import SINGLE_OBJECT_HEADERS, passthrough
+from services.trending import trending
+from services.upvote_buffer import upvote_buffer
+from services.search import search_index
+from services.log import get_logger, log_success
+from supabase_client import client, error_code, total_count
 
 router = APIRouter()
+logger = get_logger("responses")
+
+# Seconds cached reads stay fresh; writes invalidate the affected keys sooner
+RESPONSES_CACHE_TTL = 10
+COUNTS_CACHE_TTL = 10
 
 # POST /responses - create a new response to a question
 @router.post("/responses")
-def create_response(response: ResponseCreate):
-    res = client.post("/responses", json=response.dict())
+async def create_response(response: ResponseCreate):
+    res = await client.post("/responses", json=response.dict())
     if res.status_code != 201:
+        logger.warning("response insert failed", extra={"status": res.status_code, "code": error_code(res)})
         return {"error": res.text}
-    return res.json()
+    client.invalidate(f"question:{response.question_id}")
+    data = res.json()
+    for row in data if isinstance(data, list) else [data]:
+        trending.add_response(row)
+        search_index.add_response(row)
+        log_success(logger, "response created", response_id=row.get("id"), question_id=response.question_id)
+    return data
 
 @router.get("/questions/{question_id}/responses")
-def get_responses_for_question(question_id: str = Path(...)):
-    res = client.get(f"/responses?question_id=eq.{question_id}&select=*")
+async def get_responses_for_question(
+    question_id: str = Path(...),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    params = {"question_id": f"eq.{question_id}", "select": "*", **keyset_params(limit, cursor)}
+    res = await client.get(
+        "/responses",
+        params=params,
+        cache_ttl=RESPONSES_CACHE_TTL,
+        cache_tags=(f"question:{question_id}",),
+    )
     if res.status_code != 200:
         return {"error": res.text}
-    return res.json()
+    return paginate_response(res, limit)
 
 @router.get("/responses/{id}")
-def get_response_by_id(id: str):
-    res = client.get(f"/responses?id=eq.{id}&select=*")
+async def get_response_by_id(id: str):
+    res = await client.get(f"/responses?id=eq.{id}&select=*", headers=SINGLE_OBJECT_HEADERS)
+    if res.status_code == 406:
+        return {"error": "Response not found"}
     if res.status_code != 200:
         return {"error": res.text}
-    data = res.json()
-    if not data:
-        return {"error": "Response not found"}
-    return data[0]
+    return passthrough(res)
 
-# get trending responses top 10 recent
+# get trending responses, ranked by time-decayed upvotes and comments
 @router.get("/trending")
-def get_trending_responses():
-    res = client.get("/responses?select=*&order=created_at.desc&limit=10")
+async def get_trending_responses(limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE)):
+    if trending.ready:
+        return trending.top(limit)
+    # The index is still loading; fall back to the most recent responses
+    res = await client.get(f"/responses?select=*&order=created_at.desc&limit={limit}")
     if res.status_code != 200:
         return {"error": res.text}
-    return res.json()
+    return passthrough(res)
 
 # upvoting a response // POST
-@router.post("/responses/{id}/upvote")
-def upvote_response(id: str, upvote: UpvoteCreate):
-    upvote_data = upvote.dict()
-    upvote_data["response_id"] = id
-    res = client.post("/upvotes", json=upvote_data)
-    if res.status_code != 201:
-        return {"error": res.text}
-    return res.json()
+# Acknowledged right away; the upvote buffer writes it to Supabase in a batch
+@router.post("/responses/{id}/upvote", status_code=202)
+async def upvote_response(id: str, upvote: UpvoteCreate):
+    # Checked here because a bad id would only fail later, in the batch insert
+    try:
+        uuid.UUID(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Response id must be a UUID")
+    queued = upvote_buffer.add(id, upvote.user_id)
+    if queued:
+        trending.record_upvote(id)
+        log_success(logger, "upvote queued", response_id=id)
+    return {
+        "status": "queued" if queued else "already_pending",
+        "response_id": id,
+        "user_id": upvote.user_id,
+    }
 
 # retrieving upvote // GET
 @router.get("/responses/{id}/upvotes")
-def get_upvotes_for_response(id: str):
-    res = client.get(f"/upvotes?response_id=eq.{id}&select=*")
+async def get_upvotes_for_response(id: str):
+    res = await client.count(
+        "/upvotes",
+        params={"response_id": f"eq.{id}"},
+        cache_ttl=COUNTS_CACHE_TTL,
+        cache_tags=(f"response:{id}",),
+    )
+    if res.status_code not in (200, 206):
+        return {"error": f"Failed to count upvotes (status {res.status_code})"}
+    return {"count": (total_count(res) or 0) + upvote_buffer.pending_count(id)}
+
+# batch upvote counts in one round-trip // GET /upvotes/counts?response_ids=a,b,c
+@router.get("/upvotes/counts")
+async def get_upvote_counts(response_ids: str = Query(...)):
+    ids = [i for i in dict.fromkeys(response_ids.split(",")) if i]
+    if not ids:
+        return {"counts": {}}
+    if len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} response_ids per request")
+    params = {"id": f"in.({','.join(ids)})", "select": "id,upvotes(count)"}
+    res = await client.get(
+        "/responses",
+        params=params,
+        cache_ttl=COUNTS_CACHE_TTL,
+        cache_tags=[f"response:{response_id}" for response_id in ids],
+    )
     if res.status_code != 200:
         return {"error": res.text}
-    return {"count": len(res.json())}
+    counts = {response_id: 0 for response_id in ids}
+    for row in res.json():
+        counts[row["id"]] = row["upvotes"][0]["count"] if row["upvotes"] else 0
+    for response_id in counts:
+        counts[response_id] += upvote_buffer.pending_count(response_id)
+    return {"counts": counts}
 
 # comments // POST
 @router.post("/responses/{id}/comments")
-def create_comment(id: str, comment: CommentCreate):
+async def create_comment(id: str, comment: CommentCreate):
     comment_data = comment.dict()
     comment_data["response_id"] = id
 
-    res = client.post("/comments", json=comment_data)
+    res = await client.post("/comments", json=comment_data)
 
-    # Debug and fail gracefully if the response isn't as expected
+    # Fail gracefully if the response isn't as expected
     if res.status_code != 201:
-        print("❌ Failed to create comment")
-        print("Status Code:", res.status_code)
-        print("Response Text:", res.text)
-        print("Payload Sent:", comment_data)
+        logger.warning("comment insert failed", extra={"status": res.status_code, "code": error_code(res), "response_id": id})
         return {
             "error": "Failed to create comment",
             "status_code": res.status_code,
             "response": res.text
         }
 
+    client.invalidate(f"response:{id}")
+    trending.record_comment(id)
+
     try:
-        return res.json()
+        data = res.json()
     except Exception as e:
-        print("❌ JSON parsing failed")
-        print("Raw response:", res.text)
+        logger.warning("comment insert returned invalid JSON", extra={"status": res.status_code, "response_id": id})
         return {
             "error": "Failed to parse response from Supabase",
             "detail": str(e)
         }
+    log_success(logger, "comment created", response_id=id)
+    return data
 
 
 # retrieving comment // GET
 @router.get("/responses/{id}/comments")
-def get_comments_for_response(id: str):
-    res = client.get(f"/comments?response_id=eq.{id}&select=*&order=created_at.asc")
+async def get_comments_for_response(
+    id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    # Comments read oldest-first, so the keyset walks forward in time
+    params = {"response_id": f"eq.{id}", "select": "*", **keyset_params(limit, cursor, ascending=True)}
+    res = await client.get(
+        "/comments", params=params, cache_ttl=RESPONSES_CACHE_TTL, cache_tags=(f"response:{id}",)
+    )
     if res.status_code != 200:
         return {"error": res.text}
-    return res.json()
+    return paginate_response(res, limit)
 
 @router.get("/my/responses")
-def get_my_responses(user_id: str = Query(...)):
-    res = client.get(f"/responses?user_id=eq.{user_id}&select=*")
+async def get_my_responses(
+    user_id: str = Query(...),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    params = {"user_id": f"eq.{user_id}", "select": "*", **keyset_params(limit, cursor)}
+    res = await client.get("/responses", params=params)
     if res.status_code != 200:
         return {"error": res.text}
-    return res.json()
+    return paginate_response(res, limit)
 
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Query
+from typing import Literal, Optional
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_offset_cursor, encode_offset_cursor
+from services.search import search_index
+
+router = APIRouter()
+
+# full-text search over question and response content
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[Literal["question", "response"]] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    offset = decode_offset_cursor(cursor) if cursor else 0
+    items, more = search_index.search(q, limit, offset, kind=type)
+    return {"items": items, "next_cursor": encode_offset_cursor(offset + limit) if more else None}
@@ -1,11 +1,14 @@
 from pydantic import BaseModel
-from typing import Literal, Optional
+from typing import Literal, Optional, get_args
+
+Tone = Literal["advice", "just_listen", "encouragement"]
+TONES = get_args(Tone)
 
 
 class QuestionCreate(BaseModel):
     user_id: str
     content: str
-    tone: Literal["advice", "just_listen", "encouragement"]
+    tone: Tone
 
 
 class ResponseCreate(BaseModel):
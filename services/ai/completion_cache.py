@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+from services.cache import TTLCache
+
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+
+
+def normalize_prompt(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def prompt_key(message: str, tone: str, config: Dict[str, Any]) -> str:
+    """
+    Hash of the normalized message, tone and generation settings.
+    """
+    raw = json.dumps([normalize_prompt(message), tone, config], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CompletionCache:
+    """
+    LRU+TTL cache of AI completions with single-flight coalescing.
+
+    Concurrent requests for the same key share one in-flight upstream call.
+    Each waiter awaits the shared task through asyncio.shield, so one client
+    going away does not cancel the call for everyone else; when the last
+    waiter is cancelled, the upstream call is cancelled too. Failures are
+    passed to all waiters and are never cached.
+    """
+
+    def __init__(self, max_entries: int = AI_CACHE_MAX_ENTRIES, ttl: float = AI_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._cache = TTLCache(max_entries=max_entries)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def peek(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def store(self, key: str, value: str):
+        # An empty completion (e.g. a safety block) is not worth reusing for the whole TTL
+        if value:
+            self._cache.set(key, value, ttl=self.ttl)
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, call))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                # Nobody is left to read the result
+                self._inflight.pop(key, None)
+                task.cancel()
+                self.abandoned += 1
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _run(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        self.upstream_calls += 1
+        try:
+            result = await call()
+            self.store(key, result)
+            return result
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats.update(
+            in_flight=len(self._inflight),
+            upstream_calls=self.upstream_calls,
+            coalesced=self.coalesced,
+            abandoned=self.abandoned,
+            upstream_calls_saved=self._cache.hits + self.coalesced,
+        )
+        return stats
+
+
+def _consume_exception(task: asyncio.Task):
+    # Mark the exception retrieved in case every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+completion_cache = CompletionCache()
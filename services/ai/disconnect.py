@@ -0,0 +1,31 @@
+import asyncio
+from typing import Awaitable, TypeVar
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+# How often a waiting handler checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 0.25
+
+# nginx's "client closed request"; nobody receives it, but it shows up in access logs
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_interval: float = DISCONNECT_POLL_SECONDS) -> T:
+    """
+    Await `awaitable`, cancelling it if the client disconnects first, so an
+    abandoned request stops its Gemini call instead of paying for tokens
+    nobody will read.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
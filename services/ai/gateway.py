@@ -0,0 +1,213 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Concurrency and rate limits for calls to Gemini
+AI_MAX_IN_FLIGHT = int(os.getenv("AI_MAX_IN_FLIGHT", "8"))
+AI_RATE_PER_SECOND = float(os.getenv("AI_RATE_PER_SECOND", "5"))
+AI_RATE_BURST = int(os.getenv("AI_RATE_BURST", "10"))
+# Bounded waiting: requests beyond AI_MAX_QUEUE, or waiting longer than AI_MAX_WAIT_SECONDS, get a 503
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "64"))
+AI_MAX_WAIT_SECONDS = float(os.getenv("AI_MAX_WAIT_SECONDS", "10"))
+# Retries on rate-limit and transient upstream errors
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "8"))
+# Each 429 halves the allowed call rate, down to this floor; successes win it back slowly
+AI_RATE_FLOOR = float(os.getenv("AI_RATE_FLOOR", "0.5"))
+AI_RATE_RECOVERY_CALLS = int(os.getenv("AI_RATE_RECOVERY_CALLS", "50"))
+
+# google.api_core exception names and HTTP codes worth retrying
+_RETRYABLE_NAMES = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "DeadlineExceeded",
+    "TimeoutError",
+}
+_RETRYABLE_CODES = {429, 500, 502, 503, 504}
+_RATE_LIMIT_NAMES = {"ResourceExhausted", "TooManyRequests"}
+
+
+class AIOverloaded(Exception):
+    """
+    Raised when the AI upstream cannot take more work right now.
+    Routes turn it into a 503 with a Retry-After header and `detail`.
+    """
+
+    detail = "The AI service is busy right now. Please try again shortly."
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _RETRYABLE_NAMES:
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in _RETRYABLE_CODES
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return type(error).__name__ in _RATE_LIMIT_NAMES or getattr(error, "code", None) == 429
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """
+        Take one token, returning how many seconds the caller must wait for it.
+        """
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self):
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class AIGateway:
+    """
+    Shared admission control for AI calls.
+
+    A semaphore caps calls in flight and a token bucket caps the call rate.
+    Callers wait in a bounded queue for at most `max_wait` seconds; beyond that,
+    or when the queue is full, they get AIOverloaded right away instead of
+    piling up. Retryable upstream errors are retried with full-jitter
+    exponential backoff while the caller keeps its slot; every retry takes
+    its own token, so retries cannot exceed the rate limit either.
+
+    The rate adapts to the upstream: each 429 halves it (down to
+    `AI_RATE_FLOOR`), and it climbs back to the configured rate over about
+    `AI_RATE_RECOVERY_CALLS` successful calls.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = AI_MAX_IN_FLIGHT,
+        rate_per_second: float = AI_RATE_PER_SECOND,
+        burst: int = AI_RATE_BURST,
+        max_queue: int = AI_MAX_QUEUE,
+        max_wait: float = AI_MAX_WAIT_SECONDS,
+        max_retries: int = AI_MAX_RETRIES,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self.max_rate = rate_per_second
+        self.waiting = 0
+        self.in_flight = 0
+        self.rejected = 0
+        self.retries = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one in-flight slot, e.g. for the length of a streamed reply.
+        """
+        deadline = time.monotonic() + self.max_wait
+        if not self._semaphore.locked():
+            # A slot is free; this does not wait
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise AIOverloaded("AI request queue is full", retry_after=self.max_wait)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise AIOverloaded("Timed out waiting for an AI slot", retry_after=self.max_wait)
+            finally:
+                self.waiting -= 1
+
+        try:
+            delay = self._bucket.reserve()
+            if delay > deadline - time.monotonic():
+                self._bucket.refund()
+                self.rejected += 1
+                raise AIOverloaded("AI rate limit reached", retry_after=delay)
+            if delay:
+                await asyncio.sleep(delay)
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+        finally:
+            self._semaphore.release()
+
+    async def retry(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `call`, retrying retryable errors with jittered exponential backoff.
+        The first attempt uses the token taken by slot(); each retry takes another,
+        and gives up with AIOverloaded if that token would come after `max_wait`.
+        Persistent rate limiting surfaces as AIOverloaded.
+        """
+        deadline = time.monotonic() + self.max_wait
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if is_rate_limited(e):
+                    self._slow_down()
+                if attempt == self.max_retries:
+                    raise AIOverloaded(f"AI upstream unavailable: {e}", retry_after=AI_RETRY_MAX_DELAY) from e
+                self.retries += 1
+                cap = min(AI_RETRY_MAX_DELAY, AI_RETRY_BASE_DELAY * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, cap))
+                delay = self._bucket.reserve()
+                if delay > deadline - time.monotonic():
+                    self._bucket.refund()
+                    self.rejected += 1
+                    raise AIOverloaded("AI rate limit reached", retry_after=delay) from e
+                if delay:
+                    await asyncio.sleep(delay)
+            else:
+                self._speed_up()
+                return result
+
+    def _slow_down(self):
+        self._bucket.rate = max(AI_RATE_FLOOR, self._bucket.rate / 2)
+
+    def _speed_up(self):
+        if self._bucket.rate < self.max_rate:
+            self._bucket.rate = min(self.max_rate, self._bucket.rate + self.max_rate / AI_RATE_RECOVERY_CALLS)
+
+    async def call(self, call: Callable[[], Awaitable[T]]) -> T:
+        async with self.slot():
+            return await self.retry(call)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "rate_per_second": round(self._bucket.rate, 2),
+        }
+
+
+ai_gateway = AIGateway()
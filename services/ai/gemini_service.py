@@ -1,23 +1,44 @@
-import google.generativeai as genai
-from typing import Optional
-import os
-from dotenv import load_dotenv
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
+from services.ai.completion_cache import completion_cache, prompt_key
+from services.ai.gateway import AIOverloaded, ai_gateway
+from services.ai.sessions import chat_sessions
+from services.metrics import gemini_request_duration, gemini_requests, gemini_tokens
+from settings import settings
 
-load_dotenv()
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
-# Get API key from environment
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables. Please create a .env file with your API key.")
 
-# Configure the Gemini API
-genai.configure(api_key=api_key)
+class AINotConfigured(AIOverloaded):
+    """
+    Raised on use when GEMINI_API_KEY is missing. It is an AIOverloaded so
+    the AI routes answer 503 while the rest of the API keeps working.
+    """
 
-def get_gemini_model():
-    try:
-        return genai.GenerativeModel('gemini-2.0-flash')
-    except Exception as e:
-        raise Exception(f"Failed to initialize Gemini model. Please check your API key. Error: {str(e)}")
+    detail = "The AI service is not configured."
+
+    def __init__(self):
+        super().__init__(
+            "GEMINI_API_KEY not found in environment variables. Please create a .env file with your API key.",
+            retry_after=60,
+        )
+
+
+# The Gemini SDK is slow to import, so it is loaded and configured on first use
+_genai = None
+
+def _load_sdk():
+    global _genai
+    if _genai is None:
+        if not settings.ai_configured:
+            raise AINotConfigured()
+        import google.generativeai as genai
+        genai.configure(api_key=settings.gemini_api_key)
+        _genai = genai
+    return _genai
+
+GEMINI_MODEL_NAME = "gemini-2.0-flash"
 
 SYSTEM_PROMPT = (
     "You are AskHer, a supportive and empathetic AI companion designed to help women navigate life's challenges. "
@@ -27,32 +48,171 @@ SYSTEM_PROMPT = (
     "Remember to: Validate feelings, Offer gentle guidance, Maintain a supportive tone, Encourage self-care and self-compassion."
 )
 
-async def generate_supportive_response(user_message: str, tone: Optional[str] = "supportive") -> str:
+# Extra guidance per tone; these match the tones a question can be posted with
+TONE_INSTRUCTIONS = {
+    "supportive": "",
+    "advice": " The user is asking for advice: offer one or two concrete, practical suggestions.",
+    "just_listen": " The user wants to be heard: reflect and validate their feelings without giving advice.",
+    "encouragement": " The user needs encouragement: focus on their strengths and reasons for hope.",
+}
+DEFAULT_TONE = "supportive"
+
+GENERATION_SETTINGS = {
+    "temperature": 0.7,
+    "max_output_tokens": 200,
+    "stop_sequences": ["\n*"],
+}
+
+# One long-lived model per tone, so the system instruction and generation
+# config are built once instead of on every request
+_models: Dict[str, "genai.GenerativeModel"] = {}
+
+def _normalize_tone(tone: Optional[str]) -> str:
+    return tone if tone in TONE_INSTRUCTIONS else DEFAULT_TONE
+
+def get_gemini_model(tone: Optional[str] = DEFAULT_TONE) -> "genai.GenerativeModel":
+    tone = _normalize_tone(tone)
+    model = _models.get(tone)
+    if model is None:
+        genai = _load_sdk()
+        try:
+            model = genai.GenerativeModel(
+                GEMINI_MODEL_NAME,
+                system_instruction=SYSTEM_PROMPT + TONE_INSTRUCTIONS[tone],
+                generation_config=genai.GenerationConfig(**GENERATION_SETTINGS),
+            )
+        except Exception as e:
+            raise Exception(f"Failed to initialize Gemini model. Please check your API key. Error: {str(e)}")
+        _models[tone] = model
+    return model
+
+def warm_up():
     """
-    Generate a supportive response using Gemini AI. Stateless: no chat history.
+    Import the SDK and build every tone's model up front so the first
+    requests don't pay for it. Used when AI_EAGER_STARTUP is set.
     """
-    model = get_gemini_model()
-    prompt = (
-        f"{SYSTEM_PROMPT}\n\n"
-        f"User: {user_message}\n\n"
-        f"AI:"
-    )
+    for tone in TONE_INSTRUCTIONS:
+        get_gemini_model(tone)
+
+def _completion_key(user_message: str, tone: str) -> str:
+    return prompt_key(user_message, tone, {"model": GEMINI_MODEL_NAME, **GENERATION_SETTINGS})
+
+def _apology(error: Exception) -> str:
+    error_msg = str(error)
+    if "API key" in error_msg or "credentials" in error_msg:
+        return "I apologize, but there seems to be an issue with the AI service configuration. Please make sure the API key is properly set up."
+    return f"I apologize, but I'm having trouble processing that right now. Could you try rephrasing your message? Error: {error_msg}"
+
+async def _timed_call(kind: str, start_call):
+    """
+    One upstream attempt, recorded in the Gemini latency and outcome metrics.
+    """
+    start = time.perf_counter()
     try:
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={
-                "temperature": 0.7,
-                "max_output_tokens": 200,
-                "stop_sequences": ["\n*"]
-            }
+        response = await start_call()
+    except Exception as e:
+        gemini_requests.labels(kind, type(e).__name__).inc()
+        raise
+    finally:
+        gemini_request_duration.labels(kind).observe(time.perf_counter() - start)
+    gemini_requests.labels(kind, "ok").inc()
+    return response
+
+def _record_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        gemini_tokens.labels("prompt").inc(getattr(usage, "prompt_token_count", 0) or 0)
+        gemini_tokens.labels("completion").inc(getattr(usage, "candidates_token_count", 0) or 0)
+
+async def _generate(model: "genai.GenerativeModel", contents) -> str:
+    # Every upstream call goes through the shared gateway for admission control and retries
+    response = await ai_gateway.call(
+        lambda: _timed_call("generate", lambda: model.generate_content_async(contents))
+    )
+    _record_usage(response)
+    return response.text.strip()
+
+async def _stream(model: "genai.GenerativeModel", contents) -> AsyncIterator[str]:
+    # The gateway slot is held until the stream is fully read
+    async with ai_gateway.slot():
+        response = await ai_gateway.retry(
+            lambda: _timed_call("stream", lambda: model.generate_content_async(contents, stream=True))
         )
-        return response.text.strip()
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety or finish metadata)
+                continue
+            if text:
+                yield text
+        _record_usage(response)
+
+async def generate_reply(user_message: str, tone: Optional[str] = DEFAULT_TONE) -> str:
+    """
+    Generate a supportive reply, raising on failure. Identical prompts are
+    served from the completion cache, and concurrent identical prompts share
+    one upstream call.
+    """
+    tone = _normalize_tone(tone)
+    return await completion_cache.get_or_call(
+        _completion_key(user_message, tone),
+        lambda: _generate(get_gemini_model(tone), user_message),
+    )
+
+async def generate_supportive_response(user_message: str, tone: Optional[str] = DEFAULT_TONE) -> str:
+    """
+    Generate a supportive response using Gemini AI. Stateless: no chat history.
+    Upstream errors become an apology message; AIOverloaded is raised so the
+    route can answer 503.
+    """
+    try:
+        return await generate_reply(user_message, tone)
+    except AIOverloaded:
+        raise
     except Exception as e:
-        error_msg = str(e)
-        if "API key" in error_msg or "credentials" in error_msg:
-            return "I apologize, but there seems to be an issue with the AI service configuration. Please make sure the API key is properly set up."
-        return f"I apologize, but I'm having trouble processing that right now. Could you try rephrasing your message? Error: {error_msg}"
+        return _apology(e)
+
+async def stream_supportive_response(user_message: str, tone: Optional[str] = DEFAULT_TONE) -> AsyncIterator[str]:
+    """
+    Like generate_supportive_response, but yields text chunks as Gemini produces them.
+    A cached completion is yielded in one chunk, and a finished stream fills the cache.
+    Errors are raised to the caller, which reports them in the stream.
+    """
+    tone = _normalize_tone(tone)
+    key = _completion_key(user_message, tone)
+    cached = completion_cache.peek(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async for text in _stream(get_gemini_model(tone), user_message):
+        parts.append(text)
+        yield text
+    completion_cache.store(key, "".join(parts).strip())
 
-# For compatibility with your FastAPI route
 async def chat_with_ai(session_id: str, message: str) -> str:
-    return await generate_supportive_response(message)
\ No newline at end of file
+    """
+    Reply within a chat session. The prompt carries the session's summary and
+    its recent turns, windowed to a token budget.
+    """
+    session = await chat_sessions.load(session_id)
+    try:
+        reply = await _generate(get_gemini_model(), session.contents(message))
+    except AIOverloaded:
+        raise
+    except Exception as e:
+        return _apology(e)
+    session.add_exchange(message, reply)
+    await chat_sessions.save(session)
+    return reply
+
+async def stream_chat_with_ai(session_id: str, message: str) -> AsyncIterator[str]:
+    session = await chat_sessions.load(session_id)
+    parts = []
+    async for text in _stream(get_gemini_model(), session.contents(message)):
+        parts.append(text)
+        yield text
+    session.add_exchange(message, "".join(parts).strip())
+    await chat_sessions.save(session)
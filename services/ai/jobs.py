@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+from services.ai.gateway import AIOverloaded
+
+# Jobs running at once, and jobs accepted but not finished, per worker
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))
+AI_JOB_MAX_PENDING = int(os.getenv("AI_JOB_MAX_PENDING", "100"))
+# Seconds a finished job's result stays available
+AI_JOB_RESULT_TTL_SECONDS = float(os.getenv("AI_JOB_RESULT_TTL_SECONDS", "600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = QUEUED
+        self.result: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def finish(self, status: str, result: Any = None, error: Optional[str] = None):
+        if self.done:
+            return
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Bounded in-process executor for AI jobs.
+
+    `submit()` returns at once; the job runs as an asyncio task once one of
+    `workers` slots is free. At most `max_pending` unfinished jobs are held,
+    beyond that submit raises AIOverloaded (a 503). Finished jobs are kept
+    for `result_ttl` seconds for polling. Cancelling a job cancels its task,
+    and with it the upstream Gemini call.
+    """
+
+    def __init__(
+        self,
+        workers: int = AI_JOB_WORKERS,
+        max_pending: int = AI_JOB_MAX_PENDING,
+        result_ttl: float = AI_JOB_RESULT_TTL_SECONDS,
+    ):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._slots = asyncio.Semaphore(workers)
+        self._jobs: Dict[str, Job] = {}
+        # Finished jobs in finishing order, for TTL expiry
+        self._finished: "deque[Job]" = deque()
+        self.unfinished = 0
+        self.finished = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def submit(self, kind: str, call: Callable[[], Awaitable[Any]]) -> Job:
+        self._expire()
+        if self.unfinished >= self.max_pending:
+            self.rejected += 1
+            raise AIOverloaded("Too many AI jobs pending", retry_after=5)
+        job = Job(kind)
+        self._jobs[job.id] = job
+        self.unfinished += 1
+        job.task = asyncio.create_task(self._run(job, call))
+        job.task.add_done_callback(lambda _: self._on_done(job))
+        return job
+
+    async def _run(self, job: Job, call: Callable[[], Awaitable[Any]]):
+        async with self._slots:
+            job.status = RUNNING
+            try:
+                result = await call()
+            except Exception as e:
+                job.finish(FAILED, error=str(e))
+            else:
+                job.finish(SUCCEEDED, result=result)
+
+    def _on_done(self, job: Job):
+        # Also runs for jobs cancelled before they started
+        job.finish(CANCELLED)
+        self.unfinished -= 1
+        self.finished += 1
+        self._finished.append(job)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.task.cancel()
+            job.finish(CANCELLED)
+            self.cancelled += 1
+        return job
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        while self._finished and self._finished[0].finished_at < cutoff:
+            self._jobs.pop(self._finished.popleft().id, None)
+
+    async def stop(self):
+        tasks = [job.task for job in self._jobs.values() if not job.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "jobs": len(self._jobs),
+            "unfinished": self.unfinished,
+            "finished": self.finished,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
+
+
+ai_jobs = JobManager()
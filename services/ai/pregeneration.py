@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+from services.cache import TTLCache
+from services.ai.gateway import AIOverloaded
+from services.ai.gemini_service import generate_reply
+from services.log import get_logger
+from services.passthrough import SINGLE_OBJECT_HEADERS
+from supabase_client import SupabaseUnavailable, client as supabase, error_code
+from settings import settings
+
+logger = get_logger("ai.pregeneration")
+
+AI_PREGEN_WORKERS = int(os.getenv("AI_PREGEN_WORKERS", "2"))
+AI_PREGEN_QUEUE = int(os.getenv("AI_PREGEN_QUEUE", "500"))
+AI_PREGEN_MAX_ATTEMPTS = int(os.getenv("AI_PREGEN_MAX_ATTEMPTS", "3"))
+AI_PREGEN_RETRY_DELAY = float(os.getenv("AI_PREGEN_RETRY_DELAY", "2"))
+AI_REPLY_MAX_ENTRIES = int(os.getenv("AI_REPLY_MAX_ENTRIES", "10000"))
+AI_REPLY_TTL_SECONDS = 24 * 3600
+# Seconds a reply read from Supabase is cached; storing a reply invalidates it sooner
+AI_REPLY_CACHE_TTL = 30
+# Columns of `ai_replies` returned by the API, also embedded in the thread view
+AI_REPLY_COLUMNS = "content,created_at"
+# Seconds the thread view stops embedding `ai_replies` after PostgREST could not
+# find the relationship, e.g. before supabase/migrations has been applied
+AI_REPLY_EMBED_RETRY_SECONDS = 300
+
+
+def ai_reply_from_row(question_id: str, row: Any) -> Optional[Dict[str, Any]]:
+    """
+    Shape an `ai_replies` row, or a PostgREST embed of it (object, list or null), for the API.
+    """
+    if isinstance(row, list):
+        row = row[0] if row else None
+    if not row:
+        return None
+    return {"question_id": question_id, "content": row.get("content"), "is_ai": True, "created_at": row.get("created_at")}
+
+
+class AIReplyPregenerator:
+    """
+    Background worker pool that writes an AI reply for each new question.
+
+    `submit()` is called by create_question and never blocks it: the question
+    goes on a bounded asyncio queue (or is dropped if the queue is full) and a
+    worker generates a reply in the question's tone, with retries.
+
+    Replies are stored in the `ai_replies` table, one row per question, so
+    every worker serves them and they survive restarts; the thread view embeds
+    them. They are kept apart from `responses`, so an AI reply never shows up
+    as a user's response. The worker that generated a reply also keeps it in
+    memory, which covers the moment before the row is readable and a failed
+    write. If the table is missing, the thread view falls back to `load()`
+    (see embed_ai_reply()).
+    """
+
+    def __init__(self, client, generate, workers: int = AI_PREGEN_WORKERS, max_queue: int = AI_PREGEN_QUEUE):
+        self.client = client
+        self.generate = generate
+        self.workers = workers
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Set[str] = set()
+        self._replies = TTLCache(max_entries=AI_REPLY_MAX_ENTRIES)
+        self.generated = 0
+        self.failed = 0
+        self.dropped = 0
+        self._embed_retry_at = 0.0
+
+    def submit(self, question: Dict[str, Any]) -> bool:
+        question_id = question.get("id")
+        if not question_id or not question.get("content") or not settings.ai_configured:
+            return False
+        try:
+            self._queue.put_nowait(question)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending.add(str(question_id))
+        return True
+
+    def get(self, question_id: str) -> Optional[Dict[str, Any]]:
+        return self._replies.get(question_id)
+
+    async def load(self, question_id: str) -> Optional[Dict[str, Any]]:
+        """
+        The reply for a question from memory, else from Supabase.
+        """
+        reply = self._replies.get(question_id)
+        if reply is not None:
+            return reply
+        res = await self.client.get(
+            "/ai_replies",
+            params={"question_id": f"eq.{question_id}", "select": AI_REPLY_COLUMNS},
+            headers=SINGLE_OBJECT_HEADERS,
+            cache_ttl=AI_REPLY_CACHE_TTL,
+            cache_tags=(f"question:{question_id}",),
+        )
+        if res.status_code != 200:
+            return None
+        return ai_reply_from_row(question_id, res.json())
+
+    def embed_ai_reply(self) -> bool:
+        """
+        Whether the thread view should embed `ai_replies`; false for a while
+        after embed_missing() so a missing table does not cost a failed request
+        per thread.
+        """
+        return time.monotonic() >= self._embed_retry_at
+
+    def embed_missing(self):
+        if self.embed_ai_reply():
+            logger.warning("ai_replies relationship not found; apply supabase/migrations")
+        self._embed_retry_at = time.monotonic() + AI_REPLY_EMBED_RETRY_SECONDS
+
+    def is_pending(self, question_id: str) -> bool:
+        return question_id in self._pending
+
+    async def _work(self):
+        while True:
+            question = await self._queue.get()
+            try:
+                await self._reply_to(question)
+            except Exception:
+                logger.exception("AI pre-generation error", extra={"question_id": str(question["id"])})
+            finally:
+                self._pending.discard(str(question["id"]))
+                self._queue.task_done()
+
+    async def _reply_to(self, question: Dict[str, Any]):
+        question_id = str(question["id"])
+        content = None
+        for attempt in range(AI_PREGEN_MAX_ATTEMPTS):
+            try:
+                content = await self.generate(question["content"], question.get("tone"))
+                break
+            except AIOverloaded as e:
+                delay = max(e.retry_after, AI_PREGEN_RETRY_DELAY)
+            except Exception as e:
+                logger.warning(
+                    "AI pre-generation failed",
+                    extra={"question_id": question_id, "attempt": attempt + 1, "error": type(e).__name__},
+                )
+                delay = AI_PREGEN_RETRY_DELAY * 2 ** attempt
+            if attempt + 1 < AI_PREGEN_MAX_ATTEMPTS:
+                await asyncio.sleep(delay)
+        if content is None:
+            self.failed += 1
+            return
+
+        reply = ai_reply_from_row(
+            question_id,
+            {"content": content, "created_at": datetime.now(timezone.utc).isoformat()},
+        )
+        self._replies.set(question_id, reply, ttl=AI_REPLY_TTL_SECONDS)
+        self.generated += 1
+        await self._store(question_id, content, question.get("tone"))
+
+    async def _store(self, question_id: str, content: str, tone: Optional[str]):
+        try:
+            # Another worker may have answered the same question; the first reply wins
+            res = await self.client.post(
+                "/ai_replies",
+                json={"question_id": question_id, "content": content, "tone": tone},
+                params={"on_conflict": "question_id"},
+                headers={"Prefer": "resolution=ignore-duplicates,return=minimal"},
+            )
+        except SupabaseUnavailable as e:
+            logger.warning("storing AI reply failed", extra={"question_id": question_id, "error": type(e).__name__})
+            return
+        if res.status_code in (200, 201, 204):
+            self.client.invalidate(f"question:{question_id}")
+        else:
+            logger.warning(
+                "storing AI reply failed",
+                extra={"question_id": question_id, "status": res.status_code, "code": error_code(res)},
+            )
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "pending": len(self._pending),
+            "generated": self.generated,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+ai_replies = AIReplyPregenerator(supabase, generate_reply)
@@ -0,0 +1,364 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# "memory" keeps sessions in this process; "sqlite" shares them between workers on one host
+CHAT_SESSION_BACKEND = os.getenv("CHAT_SESSION_BACKEND", "memory")
+CHAT_SESSION_DB = os.getenv(
+    "CHAT_SESSION_DB", str(Path(__file__).resolve().parents[2] / "chat_sessions.db")
+)
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "10000"))
+CHAT_SESSION_IDLE_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+# Approximate token budgets for the verbatim history window and the rolling summary
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "300"))
+
+# Longest excerpt of a single turn kept in the summary
+_SUMMARY_EXCERPT_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text; good enough for budgeting
+    return max(1, len(text) // 4)
+
+
+def _excerpt(text: str) -> str:
+    text = " ".join(text.split())
+    for end in (". ", "? ", "! "):
+        index = text.find(end)
+        if 0 < index < _SUMMARY_EXCERPT_CHARS:
+            return text[: index + 1]
+    if len(text) > _SUMMARY_EXCERPT_CHARS:
+        return text[:_SUMMARY_EXCERPT_CHARS].rstrip() + "..."
+    return text
+
+
+class ChatTurn(NamedTuple):
+    role: str  # "user" or "model", as Gemini expects
+    text: str
+
+
+class ChatSession:
+    """
+    One conversation: a window of recent turns plus a summary of older ones.
+
+    When the window exceeds its token budget, the oldest exchange is folded
+    into the summary as a one-line excerpt, so the prompt sent per turn
+    stays roughly constant in size however long the conversation runs.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        turns: Optional[List[ChatTurn]] = None,
+        summary: str = "",
+        base_seq: int = 0,
+    ):
+        self.session_id = session_id
+        self.turns: List[ChatTurn] = list(turns or [])
+        self.summary = summary
+        # Sequence number of turns[0] over the whole conversation; persistent
+        # stores use it to append new turns and drop folded ones
+        self.base_seq = base_seq
+        self.saved_seq = base_seq + len(self.turns)
+        self.tokens = sum(estimate_tokens(turn.text) for turn in self.turns)
+        self.last_used = time.monotonic()
+
+    def contents(self, message: str) -> List[Dict[str, Any]]:
+        """
+        Build the Gemini `contents` for the next turn.
+        """
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [f"Summary of our conversation so far: {self.summary}"]})
+            contents.append({"role": "model", "parts": ["Thank you, I remember."]})
+        contents.extend({"role": turn.role, "parts": [turn.text]} for turn in self.turns)
+        contents.append({"role": "user", "parts": [message]})
+        return contents
+
+    def add_exchange(self, message: str, reply: str, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET):
+        for turn in (ChatTurn("user", message), ChatTurn("model", reply)):
+            self.turns.append(turn)
+            self.tokens += estimate_tokens(turn.text)
+        # Always keep the latest exchange verbatim
+        while self.tokens > token_budget and len(self.turns) > 2:
+            self._fold(self.turns.pop(0))
+
+    def _fold(self, turn: ChatTurn):
+        self.base_seq += 1
+        self.tokens -= estimate_tokens(turn.text)
+        speaker = "User" if turn.role == "user" else "AskHer"
+        line = f"{speaker}: {_excerpt(turn.text)}"
+        self.summary = f"{self.summary} {line}".strip()
+        max_chars = CHAT_SUMMARY_TOKEN_BUDGET * 4
+        if len(self.summary) > max_chars:
+            # Drop the oldest part of the summary, cutting at a word boundary
+            self.summary = self.summary[-max_chars:].partition(" ")[2]
+
+
+class SessionStore(ABC):
+    """
+    Where chat sessions live between turns.
+
+    `load` returns the session for an id (a new, empty one if unknown or
+    expired), and `save` persists it after an exchange has been added.
+    """
+
+    @abstractmethod
+    async def load(self, session_id: str) -> ChatSession:
+        ...
+
+    @abstractmethod
+    async def save(self, session: ChatSession):
+        ...
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Bounded in-process store with LRU and idle-TTL eviction.
+    Sessions are only visible to the worker that holds them.
+    """
+
+    def __init__(self, max_sessions: int = CHAT_MAX_SESSIONS, idle_seconds: float = CHAT_SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def load(self, session_id: str) -> ChatSession:
+        return self.get(session_id)
+
+    async def save(self, session: ChatSession):
+        # The session object is the stored state; only re-admit it if it was evicted mid-turn
+        if session.session_id not in self._sessions:
+            self._sessions[session.session_id] = session
+            self._evict()
+        session.saved_seq = session.base_seq + len(session.turns)
+
+    def get(self, session_id: str) -> ChatSession:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = ChatSession(session_id)
+            self._sessions[session_id] = session
+            self._evict()
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _expire(self):
+        # Sessions are kept in recency order, so the idle ones are at the front
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_used > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.expirations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    base_seq INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chat_sessions_updated_at ON chat_sessions (updated_at);
+"""
+
+# Roles are stored as small integers to keep rows compact
+_ROLE_CODES = {"user": 0, "model": 1}
+_ROLE_NAMES = {code: role for role, code in _ROLE_CODES.items()}
+
+# Purge expired sessions every this many saves
+_PURGE_EVERY = 500
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Persistent store in a local SQLite database in WAL mode.
+
+    Every uvicorn worker on the host opens the same file, so consecutive
+    messages of a session can land on any worker. A session is hydrated
+    lazily when it is first used in a turn. Saving appends only the new
+    turns and deletes the ones folded into the summary. Blocking SQLite calls
+    run in a worker thread. The database is opened on first use, not at import.
+
+    stats() runs on the event loop, so it never touches SQLite: the session
+    count is kept as a counter, counted exactly when the database is opened and
+    on every purge, and moved by this worker's own inserts and deletes between.
+    """
+
+    def __init__(self, path: str = CHAT_SESSION_DB, idle_seconds: float = CHAT_SESSION_IDLE_SECONDS):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._saves = 0
+        self._sessions = 0
+        self.loads = 0
+        self.expirations = 0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Only called with self._lock held
+        if self._db is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            self._db = conn
+            self._count_sessions()
+        return self._db
+
+    async def load(self, session_id: str) -> ChatSession:
+        return await asyncio.to_thread(self._load, session_id)
+
+    async def save(self, session: ChatSession):
+        await asyncio.to_thread(self._save, session)
+
+    def _load(self, session_id: str) -> ChatSession:
+        with self._lock:
+            self.loads += 1
+            row = self._conn.execute(
+                "SELECT summary, base_seq, updated_at FROM chat_sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return ChatSession(session_id)
+            summary, base_seq, updated_at = row
+            if updated_at < time.time() - self.idle_seconds:
+                self._delete(session_id)
+                self.expirations += 1
+                return ChatSession(session_id)
+            turns = [
+                ChatTurn(_ROLE_NAMES[role], text)
+                for role, text in self._conn.execute(
+                    "SELECT role, text FROM chat_turns WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                    (session_id, base_seq),
+                )
+            ]
+            return ChatSession(session_id, turns, summary, base_seq)
+
+    def _save(self, session: ChatSession):
+        end_seq = session.base_seq + len(session.turns)
+        start_seq = max(session.saved_seq, session.base_seq)
+        new_turns = [
+            (session.session_id, seq, _ROLE_CODES[session.turns[seq - session.base_seq].role],
+             session.turns[seq - session.base_seq].text)
+            for seq in range(start_seq, end_seq)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                created = self._conn.execute(
+                    "INSERT INTO chat_sessions (session_id, summary, base_seq, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (session_id) DO NOTHING",
+                    (session.session_id, session.summary, session.base_seq, now),
+                ).rowcount
+                if not created:
+                    self._conn.execute(
+                        "UPDATE chat_sessions SET summary = ?, base_seq = ?, updated_at = ? WHERE session_id = ?",
+                        (session.summary, session.base_seq, now, session.session_id),
+                    )
+                self._conn.executemany("INSERT OR REPLACE INTO chat_turns VALUES (?, ?, ?, ?)", new_turns)
+                self._conn.execute(
+                    "DELETE FROM chat_turns WHERE session_id = ? AND seq < ?",
+                    (session.session_id, session.base_seq),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._sessions += created
+            session.saved_seq = end_seq
+            self._saves += 1
+            if self._saves % _PURGE_EVERY == 0:
+                self._purge()
+
+    def _delete(self, session_id: str):
+        self._conn.execute("DELETE FROM chat_turns WHERE session_id = ?", (session_id,))
+        deleted = self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)).rowcount
+        self._sessions = max(0, self._sessions - deleted)
+
+    def _count_sessions(self):
+        # Only called with self._lock held; also folds in other workers' sessions
+        self._sessions = self._db.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+    def _purge(self):
+        cutoff = time.time() - self.idle_seconds
+        expired = [
+            row[0] for row in self._conn.execute(
+                "SELECT session_id FROM chat_sessions WHERE updated_at < ?", (cutoff,)
+            )
+        ]
+        for session_id in expired:
+            self._delete(session_id)
+        self.expirations += len(expired)
+        self._count_sessions()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "sessions": self._sessions,
+            "loads": self.loads,
+            "expirations": self.expirations,
+        }
+
+
+def create_session_store(backend: str = CHAT_SESSION_BACKEND) -> SessionStore:
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown CHAT_SESSION_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+chat_sessions = create_session_store()
@@ -0,0 +1,64 @@
+from typing import Any, AsyncIterator, Dict, Optional
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from services.ai.gateway import AIOverloaded
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop reverse proxies (nginx) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    frame = b""
+    if event:
+        frame += f"event: {event}\n".encode()
+    return frame + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+async def sse_frames(
+    chunks: AsyncIterator[str],
+    metadata: Dict[str, Any],
+    first: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Turn text chunks into Server-Sent Events.
+
+    Each chunk is sent as `{"delta": "..."}`. A final `done` event carries the
+    full response plus `metadata`, in the same shape as the non-streaming
+    route. If the upstream fails mid-stream, an `error` event is sent instead.
+    """
+    parts = []
+    if first is not None:
+        parts.append(first)
+        yield sse_event({"delta": first})
+    try:
+        async for text in chunks:
+            parts.append(text)
+            yield sse_event({"delta": text})
+    except Exception as e:
+        yield sse_event({"detail": f"Failed to generate AI response: {str(e)}"}, event="error")
+        return
+    yield sse_event({"response": "".join(parts).strip(), **metadata}, event="done")
+
+
+async def sse_response(chunks: AsyncIterator[str], metadata: Optional[Dict[str, Any]] = None) -> StreamingResponse:
+    """
+    Wait for the first chunk before starting the response, so admission errors
+    such as AIOverloaded still become a proper HTTP status instead of a 200 stream.
+    """
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except AIOverloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate AI response: {str(e)}")
+    return StreamingResponse(
+        sse_frames(chunks, metadata or {}, first),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
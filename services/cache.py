@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size", "tags")
+
+    def __init__(self, value: Any, expires_at: float, size: int, tags: tuple):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.tags = tags
+
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry TTLs and tag-based invalidation.
+
+    The cache is bounded both by entry count and by the total `size` of its
+    entries (bytes, for raw response bodies). When either bound is exceeded the
+    least recently used entries are evicted. Entries can carry tags such as
+    `question:<id>` so a write can drop exactly the keys it affects.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_size: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: float, size: int = 1, tags: Iterable[str] = ()):
+        if self.max_size is not None and size > self.max_size:
+            return
+        if key in self._entries:
+            self._remove(key)
+        entry = _Entry(value, time.monotonic() + ttl, size, tuple(tags))
+        self._entries[key] = entry
+        self._size += size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or (
+            self.max_size is not None and self._size > self.max_size
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, *tags: str) -> int:
+        """
+        Drop every entry carrying any of the given tags. Returns the number removed.
+        """
+        removed = 0
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+        self.invalidations += removed
+        return removed
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+        self._size = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from schemas.models import TONES
+from services.log import get_logger
+from supabase_client import total_count
+
+logger = get_logger("facets")
+
+# How often the counters are reset from exact counts in Supabase
+FACETS_RECONCILE_SECONDS = float(os.getenv("FACETS_RECONCILE_SECONDS", "600"))
+# Seconds between on-demand seeding attempts while Supabase cannot be counted
+FACETS_RETRY_SECONDS = 5
+
+
+class ToneFacets:
+    """
+    Per-tone question counts kept in memory.
+
+    The counters are seeded from Supabase, incremented as questions are
+    created, and periodically reset to exact counts, which also folds in
+    questions created through other workers. Questions recorded while those
+    counts are being read are journaled and replayed on top of the reset.
+    """
+
+    def __init__(self, tones: Iterable[str] = TONES):
+        self.tones = tuple(tones)
+        self._counts: Dict[str, int] = {tone: 0 for tone in self.tones}
+        self.ready = False
+        self.retry_at = 0.0
+        self._seeding: Optional[asyncio.Task] = None
+        # One reconcile at a time, so journals never overlap
+        self._reconciling = asyncio.Lock()
+        self._journal: Optional[List[str]] = None
+
+    def record(self, tone: str):
+        if tone in self._counts:
+            if self._journal is not None:
+                self._journal.append(tone)
+            self._counts[tone] += 1
+
+    def start_journal(self):
+        self._journal = []
+
+    def stop_journal(self):
+        self._journal = None
+
+    def reset(self, counts: Dict[str, int]):
+        journal, self._journal = self._journal or [], None
+        self._counts = {tone: counts.get(tone, 0) for tone in self.tones}
+        for tone in journal:
+            self.record(tone)
+        self.ready = True
+
+    def counts(self) -> Dict[str, Any]:
+        return {"tones": dict(self._counts), "total": sum(self._counts.values())}
+
+
+async def reconcile(facets: ToneFacets, client) -> bool:
+    """
+    Count each tone with a HEAD request; the tones are counted concurrently.
+    """
+    async with facets._reconciling:
+        facets.start_journal()
+        try:
+            responses = await asyncio.gather(
+                *(client.count("/questions", params={"tone": f"eq.{tone}"}) for tone in facets.tones)
+            )
+            counts = {}
+            for tone, res in zip(facets.tones, responses):
+                total = total_count(res)
+                if res.status_code not in (200, 206) or total is None:
+                    logger.warning("facet count failed", extra={"tone": tone, "status": res.status_code})
+                    return False
+                counts[tone] = total
+            facets.reset(counts)
+        finally:
+            facets.stop_journal()
+    return True
+
+
+async def ensure_ready(facets: ToneFacets, client) -> bool:
+    """
+    Seed the counters on demand if the background reconcile has not yet.
+    Concurrent callers share one attempt, and after a failure no new attempt
+    is made for FACETS_RETRY_SECONDS.
+    """
+    if facets.ready:
+        return True
+    if facets._seeding is None:
+        if time.monotonic() < facets.retry_at:
+            return False
+        facets._seeding = asyncio.ensure_future(_seed(facets, client))
+    return await asyncio.shield(facets._seeding)
+
+
+async def _seed(facets: ToneFacets, client) -> bool:
+    try:
+        ok = await reconcile(facets, client)
+    except Exception as e:
+        logger.warning("facet seeding failed", extra={"error": type(e).__name__})
+        ok = False
+    if not ok:
+        facets.retry_at = time.monotonic() + FACETS_RETRY_SECONDS
+    facets._seeding = None
+    return ok
+
+
+async def run_reconciler(facets: ToneFacets, client, interval: float = FACETS_RECONCILE_SECONDS):
+    while True:
+        try:
+            await reconcile(facets, client)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("facet reconcile error")
+        await asyncio.sleep(interval)
+
+
+tone_facets = ToneFacets()
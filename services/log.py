@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# `json` for one object per line, `text` for a plain format when reading logs by eye
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Share of success-path records that are kept; warnings and errors are always kept
+LOG_SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "0.01"))
+# Records waiting for the writer thread; beyond this they are dropped rather than waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Seconds stop() waits for the writer thread to make room for its stop marker
+LOG_STOP_TIMEOUT = 5
+
+# Id of the request being served, set by RequestIdMiddleware
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed in `extra` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"askher.{name}")
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamp records with the current request id. Runs on the calling task, before
+    the record crosses to the writer thread where the context is not available.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the message on the calling task; only resolve
+        # args here and leave formatting to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _QueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # The stock put_nowait() raises queue.Full if the queue is full at shutdown;
+        # the writer is still draining it, so wait for room instead
+        self.queue.put(self._sentinel, timeout=LOG_STOP_TIMEOUT)
+
+
+class LogPipeline:
+    """
+    Non-blocking logging for the `askher` loggers.
+
+    Callers only put records on an in-memory queue; a QueueListener thread
+    formats them and does the write, so a slow stdout or log shipper never
+    stalls the event loop. If the writer falls behind by `max_queue` records,
+    new ones are dropped and counted instead of blocking. Started and stopped
+    by the app lifespan; stopping drains the queue.
+    """
+
+    def __init__(self, level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, max_queue: int = LOG_QUEUE_SIZE, stream=None):
+        self.level = level
+        self.fmt = fmt
+        self.max_queue = max_queue
+        self.stream = stream
+        self._handler: Optional[QueueHandler] = None
+        self._listener: Optional[_QueueListener] = None
+
+    def start(self):
+        if self._listener is not None:
+            return
+        output = logging.StreamHandler(self.stream or sys.stdout)
+        if self.fmt == "text":
+            output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+        else:
+            output.setFormatter(JsonFormatter())
+        log_queue = queue.Queue(self.max_queue)
+        self._handler = _QueueHandler(log_queue)
+        self._handler.addFilter(RequestIdFilter())
+        self._listener = _QueueListener(log_queue, output, respect_handler_level=False)
+        self._listener.start()
+
+        root = logging.getLogger("askher")
+        root.setLevel(self.level)
+        root.addHandler(self._handler)
+        # Keep records out of the root logger's synchronous handlers
+        root.propagate = False
+
+    def stop(self):
+        if self._listener is None:
+            return
+        root = logging.getLogger("askher")
+        root.removeHandler(self._handler)
+        root.propagate = True
+        try:
+            # Writes out everything queued before returning
+            self._listener.stop()
+        except queue.Full:
+            # The writer made no progress for LOG_STOP_TIMEOUT; its daemon thread
+            # is abandoned rather than holding up shutdown
+            print(f"log writer stuck; {self._handler.queue.qsize()} records not written", file=sys.stderr)
+        self._listener = None
+        self._handler = None
+
+    def stats(self):
+        handler = self._handler
+        return {
+            "running": self._listener is not None,
+            "queued": handler.queue.qsize() if handler else 0,
+            "dropped": handler.dropped if handler else 0,
+        }
+
+
+def log_success(logger: logging.Logger, msg: str, **fields):
+    """
+    Log a success-path event at INFO for a sample of calls. The sampling
+    decision is made before a record is built, so unsampled calls cost a
+    random() and nothing else.
+    """
+    if random.random() < LOG_SUCCESS_SAMPLE_RATE and logger.isEnabledFor(logging.INFO):
+        logger.info(msg, extra={"sampled": LOG_SUCCESS_SAMPLE_RATE, **fields})
+
+
+log_pipeline = LogPipeline()
@@ -0,0 +1,428 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from services.log import get_logger
+
+logger = get_logger("metrics")
+
+# Directory shared by all uvicorn workers on a host; each worker writes its
+# snapshot there and /metrics merges them. Unset: only this worker is reported.
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# Counters and histograms of exited workers, folded into one file by prune()
+_RETIRED_FILE = "retired.json"
+_PRUNE_LOCK = ".prune.lock"
+# A prune lock older than this was left behind by a worker that died mid-prune
+_PRUNE_LOCK_STALE_SECONDS = 60
+# Tells this process apart from an earlier one that had the same pid
+_STARTED = time.time()
+
+# Latency buckets in seconds, from a cached read to a slow AI reply
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _Scalar(_Metric):
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [[list(values), child.value] for values, child in self._children.items()]
+
+
+class Counter(_Scalar):
+    type = "counter"
+
+
+class Gauge(_Scalar):
+    """
+    A value that goes up and down. Across workers, only live workers' values are summed.
+    """
+
+    type = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bound plus +Inf; cumulated only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram. Observing is a bisect and two additions, and
+    bucket counts from several workers merge by simple addition.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        return [[list(values), child.counts, child.sum] for values, child in self._children.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], None]):
+        """
+        Run `collect` before every snapshot, to copy stats kept elsewhere into metrics.
+        """
+        self._collectors.append(collect)
+
+    def snapshot(self) -> Dict:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception("metrics collector failed")
+        return {
+            "pid": os.getpid(),
+            "started": _STARTED,
+            "metrics": {
+                name: {
+                    "type": metric.type,
+                    "help": metric.help,
+                    "labelnames": list(metric.labelnames),
+                    "buckets": list(getattr(metric, "buckets", ())),
+                    "samples": metric.samples(),
+                }
+                for name, metric in self._metrics.items()
+            },
+        }
+
+    # ---- multi-worker ----
+
+    def write(self, directory: str = METRICS_DIR):
+        """
+        Atomically replace this worker's snapshot file in `directory`.
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        _write_json(path / f"{os.getpid()}.json", self.snapshot())
+
+    def collect_all(self, directory: Optional[str] = METRICS_DIR) -> List[Dict]:
+        return [self.snapshot(), *read_snapshots(directory)]
+
+    def render(self, directory: Optional[str] = METRICS_DIR) -> str:
+        """
+        Prometheus text exposition of this worker merged with every snapshot in `directory`.
+        Counters and histograms are summed over all workers, including exited ones, so
+        they never go backwards; gauges only over live workers.
+        """
+        return render_snapshots(self.collect_all(directory))
+
+    async def render_async(self, directory: Optional[str] = METRICS_DIR) -> str:
+        """
+        render() for the event loop: this worker's snapshot is taken on the loop,
+        the other workers' files are read in a thread.
+        """
+        others = await asyncio.to_thread(read_snapshots, directory) if directory else []
+        return render_snapshots([self.snapshot(), *others])
+
+
+def render_snapshots(snapshots: List[Dict]) -> str:
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        alive = snapshot.get("alive", True)
+        for name, metric in snapshot["metrics"].items():
+            if metric["type"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, "values": {}})
+            for sample in metric["samples"]:
+                labels = tuple(sample[0])
+                if metric["type"] == "histogram":
+                    counts, total = target["values"].get(labels, ([0] * len(sample[1]), 0.0))
+                    target["values"][labels] = ([a + b for a, b in zip(counts, sample[1])], total + sample[2])
+                else:
+                    target["values"][labels] = target["values"].get(labels, 0.0) + sample[1]
+
+    _add_hit_ratio(merged)
+    lines = []
+    for name, metric in sorted(merged.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for labels, value in sorted(metric["values"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip([*metric["buckets"], math.inf], counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{name}_bucket{_labels([*labelnames, 'le'], [*labels, le])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _add_hit_ratio(merged: Dict[str, Dict]):
+    # Ratios do not add up across workers, so derive them after merging the counters
+    hits = merged.get("askher_cache_hits_total", {}).get("values", {})
+    misses = merged.get("askher_cache_misses_total", {}).get("values", {})
+    values = {}
+    for labels, hit_count in hits.items():
+        total = hit_count + misses.get(labels, 0.0)
+        values[labels] = round(hit_count / total, 4) if total else 0.0
+    if values:
+        merged["askher_cache_hit_ratio"] = {
+            "type": "gauge",
+            "help": "Cache hits / lookups, over all workers",
+            "labelnames": ["cache"],
+            "buckets": [],
+            "values": values,
+        }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (TypeError, ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_snapshots(directory: Optional[str] = METRICS_DIR) -> List[Dict]:
+    """
+    Snapshots of the other workers in `directory`, plus the retired totals.
+    Blocking file reads; off the event loop, use Registry.render_async().
+    """
+    if not directory or not os.path.isdir(directory):
+        return []
+    path = Path(directory)
+    snapshots = []
+    for file in path.glob("[0-9]*.json"):
+        snapshot = _read_json(file)
+        if snapshot is not None and snapshot.get("pid") != os.getpid():
+            snapshot["alive"] = _pid_alive(snapshot.get("pid"))
+            snapshots.append(snapshot)
+    # Read last: prune() replaces it before deleting the files it absorbed, so a
+    # worker file that vanished above is always counted in this one
+    retired = _read_json(path / _RETIRED_FILE)
+    if retired is None:
+        return snapshots
+    absorbed = set(retired.get("absorbed", ()))
+    snapshots = [snapshot for snapshot in snapshots if _worker_id(snapshot) not in absorbed]
+    snapshots.append({**retired, "alive": False})
+    return snapshots
+
+
+def prune(directory: str = METRICS_DIR):
+    """
+    Fold the snapshots of exited workers into `retired.json` and delete them, so
+    the directory holds one file per live worker plus one. Counters and
+    histograms keep their totals; gauges of exited workers are not reported
+    anyway. One worker prunes at a time, guarded by a lock file.
+    """
+    path = Path(directory)
+    lock = path / _PRUNE_LOCK
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        try:
+            if time.time() - lock.stat().st_mtime > _PRUNE_LOCK_STALE_SECONDS:
+                lock.unlink()
+        except OSError:
+            pass
+        return
+    try:
+        dead = []
+        for file in path.glob("[0-9]*.json"):
+            snapshot = _read_json(file)
+            if snapshot is not None and not _pid_alive(snapshot.get("pid")):
+                dead.append((file, snapshot))
+        if not dead:
+            return
+        retired = _read_json(path / _RETIRED_FILE) or {"pid": None, "metrics": {}}
+        # Files a previous prune folded in but died before deleting
+        absorbed = set(retired.get("absorbed", ()))
+        for _, snapshot in dead:
+            if _worker_id(snapshot) not in absorbed:
+                _fold(retired["metrics"], snapshot["metrics"])
+        retired["absorbed"] = [_worker_id(snapshot) for _, snapshot in dead]
+        _write_json(path / _RETIRED_FILE, retired)
+        for file, _ in dead:
+            file.unlink(missing_ok=True)
+    finally:
+        lock.unlink(missing_ok=True)
+
+
+def _fold(into: Dict[str, Dict], metrics: Dict[str, Dict]):
+    for name, metric in metrics.items():
+        if metric["type"] == "gauge":
+            continue
+        target = into.setdefault(name, {**metric, "samples": []})
+        samples = {tuple(sample[0]): sample for sample in target["samples"]}
+        for sample in metric["samples"]:
+            existing = samples.get(tuple(sample[0]))
+            if existing is None:
+                samples[tuple(sample[0])] = list(sample)
+            elif metric["type"] == "histogram":
+                existing[1] = [a + b for a, b in zip(existing[1], sample[1])]
+                existing[2] += sample[2]
+            else:
+                existing[1] += sample[1]
+        target["samples"] = list(samples.values())
+
+
+def _worker_id(snapshot: Dict) -> str:
+    return f"{snapshot.get('pid')}:{snapshot.get('started')}"
+
+
+def _read_json(file: Path) -> Optional[Dict]:
+    try:
+        return json.loads(file.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(file: Path, data: Dict):
+    tmp = file.with_name(f".{os.getpid()}.{file.name}.tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, file)
+
+
+async def run_writer(registry: "Registry", directory: str = METRICS_DIR, interval: float = METRICS_FLUSH_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            registry.write(directory)
+            await asyncio.to_thread(prune, directory)
+        except Exception:
+            logger.exception("metrics write failed")
+
+
+metrics = Registry()
+
+# HTTP server
+http_requests = metrics.counter(
+    "askher_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_request_duration = metrics.histogram(
+    "askher_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+http_in_flight = metrics.gauge("askher_http_requests_in_flight", "HTTP requests being served")
+
+# Supabase (PostgREST) upstream
+supabase_requests = metrics.counter(
+    "askher_supabase_requests_total", "Supabase requests by table and status", ("method", "table", "status")
+)
+supabase_request_duration = metrics.histogram(
+    "askher_supabase_request_duration_seconds", "Supabase request latency by table", ("method", "table")
+)
+
+# Gemini upstream
+gemini_requests = metrics.counter(
+    "askher_gemini_requests_total", "Gemini calls by kind and outcome (ok or error class)", ("kind", "outcome")
+)
+gemini_request_duration = metrics.histogram(
+    "askher_gemini_request_duration_seconds", "Gemini call latency (to first chunk for streams)", ("kind",)
+)
+gemini_tokens = metrics.counter("askher_gemini_tokens_total", "Gemini tokens used", ("type",))
+
+# In-process caches; hit ratio = hits / (hits + misses)
+cache_hits = metrics.counter("askher_cache_hits_total", "Cache hits", ("cache",))
+cache_misses = metrics.counter("askher_cache_misses_total", "Cache misses", ("cache",))
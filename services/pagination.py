@@ -0,0 +1,104 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+import httpx
+import orjson
+from services.passthrough import RawJSONResponse
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """
+    Build an opaque cursor from the (created_at, id) keyset of the last row on a page.
+    """
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_params(limit: int, cursor: Optional[str] = None, ascending: bool = False) -> Dict[str, str]:
+    """
+    Translate a page request into PostgREST query parameters.
+
+    Rows are ordered by (created_at, id) and the cursor becomes a range filter
+    on that pair, so every page is an index range scan no matter how deep it is.
+    """
+    direction = "asc" if ascending else "desc"
+    params = {
+        "order": f"created_at.{direction},id.{direction}",
+        "limit": str(limit),
+    }
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        op = "gt" if ascending else "lt"
+        params["or"] = (
+            f'(created_at.{op}."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.{op}."{row_id}"))'
+        )
+    return params
+
+
+def paginate(rows: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """
+    Wrap one page of rows. A full page carries a next_cursor; a short page is the last one.
+    """
+    next_cursor = encode_cursor(rows[-1]) if rows and len(rows) >= limit else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def page_row_count(res: httpx.Response) -> Optional[int]:
+    """
+    Number of rows in a PostgREST response, read from its Content-Range header (`0-19/*`).
+    """
+    content_range = res.headers.get("content-range", "")
+    span = content_range.partition("/")[0]
+    if span == "*":
+        return 0
+    first, _, last = span.partition("-")
+    if first.isdigit() and last.isdigit():
+        return int(last) - int(first) + 1
+    return None
+
+
+def paginate_response(res: httpx.Response, limit: int) -> RawJSONResponse:
+    """
+    Like paginate(), but splices the upstream JSON array into the page envelope as raw
+    bytes. Only a full page is parsed, to read the cursor from its last row.
+    """
+    rows = page_row_count(res)
+    next_cursor = None
+    if rows is None or rows >= limit:
+        data = orjson.loads(res.content)
+        if data and len(data) >= limit:
+            next_cursor = encode_cursor(data[-1])
+    body = b'{"items":' + (res.content or b"[]") + b',"next_cursor":' + orjson.dumps(next_cursor) + b"}"
+    return RawJSONResponse(content=body)
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """
+    Cursor for result lists that have no stable keyset, such as search rankings.
+    """
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode().rstrip("=")
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded))["offset"]
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError(offset)
+        return offset
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,19 @@
+import httpx
+from starlette.responses import Response
+
+# Ask PostgREST for a single row as a bare JSON object instead of a one-element array
+SINGLE_OBJECT_HEADERS = {"Accept": "application/vnd.pgrst.object+json"}
+
+
+class RawJSONResponse(Response):
+    """
+    A response whose body is already-encoded JSON bytes, sent without re-serializing.
+    """
+    media_type = "application/json"
+
+
+def passthrough(res: httpx.Response) -> RawJSONResponse:
+    """
+    Forward a PostgREST body to the client as-is: no json() parse, no re-encode.
+    """
+    return RawJSONResponse(content=res.content, status_code=res.status_code)
@@ -0,0 +1,135 @@
+import random
+import time
+from typing import Dict, Iterator, Tuple
+from services.log import get_logger
+from services.metrics import metrics
+
+logger = get_logger("resilience")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+# One series per breaker and state, 1 for the current state; summed over workers it
+# reads as the number of workers in each state
+breaker_state = metrics.gauge(
+    "askher_circuit_breaker_state", "Workers whose circuit breaker is in each state", ("breaker", "state")
+)
+breaker_rejected = metrics.counter(
+    "askher_circuit_breaker_rejected_total", "Calls failed fast by an open circuit breaker", ("breaker",)
+)
+breaker_opened = metrics.counter(
+    "askher_circuit_breaker_opened_total", "Times a circuit breaker opened", ("breaker",)
+)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while an upstream is down.
+
+    After `failure_threshold` consecutive failures the breaker opens and every
+    call is refused for `reset_timeout` seconds. Then a single probe call is let
+    through (half-open): success closes the breaker, failure opens it again for
+    another cool-off. Callers report one outcome per logical call with
+    record_success() or record_failure(), passing the `probe` flag from
+    allow(); a probe that ends without a verdict hands its slot back with
+    release().
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+        self._publish()
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        Return (allowed, probe): whether the call may go ahead, and whether it
+        is the half-open probe and so must end in record_*() or release().
+        """
+        if self.state == CLOSED:
+            return True, False
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return self._reject(), False
+            self._transition(HALF_OPEN)
+        if self._probing:
+            return self._reject(), False
+        self._probing = True
+        return True, True
+
+    def retry_after(self) -> float:
+        if self.state != OPEN:
+            return 1.0
+        return max(1.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self, probe: bool = False):
+        if not self._settles(probe):
+            return
+        self.failures = 0
+        if self.state != CLOSED:
+            self._transition(CLOSED)
+
+    def record_failure(self, probe: bool = False):
+        if not self._settles(probe):
+            return
+        self.failures += 1
+        if probe or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.opened += 1
+            breaker_opened.labels(self.name).inc()
+            self._transition(OPEN)
+
+    def _settles(self, probe: bool) -> bool:
+        # Once the breaker has left CLOSED only its probe decides; a call admitted
+        # before it opened may finish later, and its outcome is stale by then
+        if probe:
+            self._probing = False
+            return True
+        return self.state == CLOSED
+
+    def release(self):
+        # Only for the probe, e.g. cancelled because its client went away; any
+        # other call releasing here would let a second probe in beside it
+        self._probing = False
+
+    def _reject(self) -> bool:
+        self.rejected += 1
+        breaker_rejected.labels(self.name).inc()
+        return False
+
+    def _transition(self, state: str):
+        if state == OPEN:
+            logger.warning("circuit breaker opened", extra={"breaker": self.name, "failures": self.failures})
+        elif state == CLOSED:
+            logger.info("circuit breaker closed", extra={"breaker": self.name})
+        self.state = state
+        self._publish()
+
+    def _publish(self):
+        for state in STATES:
+            breaker_state.labels(self.name, state).set(1 if state == self.state else 0)
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_after": round(self.retry_after(), 1) if self.state == OPEN else None,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+def backoff_delays(retries: int, base: float, cap: float) -> Iterator[float]:
+    """
+    Full-jitter exponential backoff: the n-th delay is uniform in [0, min(cap, base * 2**n)].
+    """
+    for attempt in range(retries):
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
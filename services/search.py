@@ -0,0 +1,242 @@
+import asyncio
+import bisect
+import heapq
+import math
+import os
+import re
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from services.cache import TTLCache
+from services.log import get_logger
+from services.pagination import encode_cursor, keyset_params
+
+logger = get_logger("search")
+
+# BM25 parameters
+SEARCH_K1 = 1.2
+SEARCH_B = 0.75
+# Best-scoring documents kept per term (its "champion list"); bounds the work per query term
+SEARCH_CHAMPIONS = 1000
+# Most vocabulary terms a trailing prefix expands to, and champions read per expanded term
+SEARCH_MAX_PREFIX_TERMS = 10
+SEARCH_PREFIX_CHAMPIONS = 100
+# Ranked results kept per query, i.e. the deepest page a query can reach
+SEARCH_MAX_RESULTS = 1000
+SEARCH_CACHE_ENTRIES = int(os.getenv("SEARCH_CACHE_ENTRIES", "1000"))
+# Page size for the startup bulk load
+SEARCH_LOAD_PAGE_SIZE = 1000
+
+# Columns kept per document and returned in results
+_FIELDS = {
+    "question": ("id", "content", "tone", "created_at"),
+    "response": ("id", "question_id", "content", "created_at"),
+}
+
+_TOKEN = re.compile(r"[^\W_]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its me my of on or so "
+    "that the this to was we were what when which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+class SearchIndex:
+    """
+    In-process inverted index over question and response content, ranked with BM25.
+
+    Postings map each term to {doc number: term frequency}. Each term also has
+    a champion list: its SEARCH_CHAMPIONS documents with the highest BM25 term
+    weight, best first. A query only scores the champion lists of its terms,
+    so its cost does not grow with the corpus. The trade-off is that a document
+    outside every champion list of a query cannot match it. The last query
+    token also matches as a prefix, expanded against a sorted vocabulary with
+    bisect. Ranked results are cached per query and index version, so paging
+    through a query does not score it again. Documents are never edited or
+    deleted here, so the index only ever grows.
+    """
+
+    def __init__(self):
+        self._docs: List[Tuple[str, Dict[str, Any]]] = []
+        self._keys: Dict[Tuple[str, str], int] = {}
+        self._lengths: List[int] = []
+        self._total_length = 0
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # term -> [(-weight, doc)] ascending, i.e. best first; built lazily per term
+        self._champions: Dict[str, List[Tuple[float, int]]] = {}
+        self._vocab: List[str] = []
+        self._results = TTLCache(max_entries=SEARCH_CACHE_ENTRIES)
+        self.version = 0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _add(self, kind: str, row: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        Index one row and return the terms it added to the vocabulary.
+        """
+        row_id = row.get("id")
+        content = row.get("content")
+        if row_id is None or not content or (kind, str(row_id)) in self._keys:
+            return None
+        doc = len(self._docs)
+        self._keys[(kind, str(row_id))] = doc
+        self._docs.append((kind, {field: row.get(field) for field in _FIELDS[kind]}))
+        terms = tokenize(content)
+        self._lengths.append(len(terms))
+        self._total_length += len(terms)
+        new_terms = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                new_terms.append(term)
+            postings[doc] = postings.get(doc, 0) + 1
+        for term in set(terms):
+            champions = self._champions.get(term)
+            if champions is not None:
+                bisect.insort(champions, (-self._weight(self._postings[term][doc], doc), doc))
+                if len(champions) > SEARCH_CHAMPIONS:
+                    champions.pop()
+        self.version += 1
+        return new_terms
+
+    def _weight(self, tf: int, doc: int) -> float:
+        """
+        BM25 term-frequency component; the query multiplies it by the term's idf.
+        """
+        avg_length = self._total_length / len(self._docs) if self._docs else 1.0
+        norm = SEARCH_K1 * (1 - SEARCH_B + SEARCH_B * self._lengths[doc] / avg_length)
+        return tf * (SEARCH_K1 + 1) / (tf + norm)
+
+    def _champions_for(self, term: str) -> List[Tuple[float, int]]:
+        champions = self._champions.get(term)
+        if champions is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return []
+            weighted = ((-self._weight(tf, doc), doc) for doc, tf in postings.items())
+            champions = heapq.nsmallest(SEARCH_CHAMPIONS, weighted)
+            self._champions[term] = champions
+        return champions
+
+    async def build_champions(self):
+        """
+        Build every term's champion list ahead of the first queries, yielding
+        to the event loop between batches.
+        """
+        for count, term in enumerate(list(self._postings)):
+            self._champions_for(term)
+            if count % 500 == 0:
+                await asyncio.sleep(0)
+
+    def add(self, kind: str, row: Dict[str, Any]):
+        for term in self._add(kind, row) or ():
+            bisect.insort(self._vocab, term)
+
+    def add_question(self, row: Dict[str, Any]):
+        self.add("question", row)
+
+    def add_response(self, row: Dict[str, Any]):
+        self.add("response", row)
+
+    def add_many(self, kind: str, rows: Iterable[Dict[str, Any]]):
+        added = False
+        for row in rows:
+            added = bool(self._add(kind, row)) or added
+        if added:
+            # One sort instead of an insort per new term
+            self._vocab = sorted(self._postings)
+
+    def _expand(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocab, prefix)
+        terms = []
+        for term in self._vocab[start:start + SEARCH_MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _rank(self, terms: List[str], kind: Optional[str]) -> List[Tuple[int, float]]:
+        key = (self.version, tuple(terms), kind)
+        ranked = self._results.get(key)
+        if ranked is not None:
+            return ranked
+
+        # The last token is usually still being typed, so it matches as a prefix too
+        expanded = [term for term in self._expand(terms[-1]) if term != terms[-1]]
+        query_terms = [(term, SEARCH_CHAMPIONS) for term in set(terms)]
+        query_terms += [(term, SEARCH_PREFIX_CHAMPIONS) for term in expanded if term not in terms]
+
+        total_docs = len(self._docs)
+        scores: Dict[int, float] = {}
+        for term, depth in query_terms:
+            champions = self._champions_for(term)
+            if not champions:
+                continue
+            df = len(self._postings[term])
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            for neg_weight, doc in champions[:depth]:
+                scores[doc] = scores.get(doc, 0.0) - idf * neg_weight
+
+        if kind is not None:
+            docs = self._docs
+            scores = {doc: score for doc, score in scores.items() if docs[doc][0] == kind}
+        ranked = sorted(scores.items(), key=itemgetter(1), reverse=True)[:SEARCH_MAX_RESULTS]
+        self._results.set(key, ranked, ttl=3600)
+        return ranked
+
+    def search(self, query: str, limit: int, offset: int = 0, kind: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Return one page of results for `query` and whether more follow.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return [], False
+        ranked = self._rank(terms, kind)
+        page = []
+        for doc, score in ranked[offset:offset + limit]:
+            doc_kind, row = self._docs[doc]
+            page.append({"type": doc_kind, **row, "score": round(score, 4)})
+        return page, offset + limit < len(ranked)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": len(self._docs), "terms": len(self._postings), "ready": self.ready}
+
+
+async def _load_table(index: SearchIndex, client, table: str, kind: str):
+    cursor = None
+    while True:
+        params = {"select": ",".join(_FIELDS[kind]), **keyset_params(SEARCH_LOAD_PAGE_SIZE, cursor)}
+        res = await client.get(f"/{table}", params=params)
+        if res.status_code != 200:
+            raise RuntimeError(f"{res.status_code} {res.text}")
+        rows = res.json()
+        index.add_many(kind, rows)
+        if len(rows) < SEARCH_LOAD_PAGE_SIZE:
+            return
+        cursor = encode_cursor(rows[-1])
+        # Let request handlers run between pages
+        await asyncio.sleep(0)
+
+
+async def build_index(index: SearchIndex, client):
+    """
+    Bulk-load every question and response with keyset-paginated reads.
+    Rows created meanwhile are added by the create routes; duplicates are skipped.
+    """
+    try:
+        await _load_table(index, client, "questions", "question")
+        await _load_table(index, client, "responses", "response")
+        await index.build_champions()
+        index.ready = True
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("search index build failed")
+
+
+search_index = SearchIndex()
@@ -0,0 +1,265 @@
+import asyncio
+import bisect
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from services.log import get_logger
+from services.upvote_buffer import upvote_buffer
+from supabase_client import error_code
+
+logger = get_logger("trending")
+
+# Scoring knobs: every upvote/comment adds weight that halves every half-life
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "12"))
+TRENDING_RESPONSE_WEIGHT = 1.0
+TRENDING_UPVOTE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 2.0
+
+# Reconciliation with Supabase
+TRENDING_RECONCILE_SECONDS = float(os.getenv("TRENDING_RECONCILE_SECONDS", "300"))
+TRENDING_WINDOW_DAYS = float(os.getenv("TRENDING_WINDOW_DAYS", "7"))
+TRENDING_MAX_RESPONSES = int(os.getenv("TRENDING_MAX_RESPONSES", "2000"))
+# Engagement is loaded as counts per age bucket (upper edges, in hours), not as rows;
+# each bucket's count is scored at the bucket's middle age
+TRENDING_BUCKET_HOURS = (1, 2, 4, 8, 16, 32, 64)
+
+# (select alias, weight, event time) for one age-bucketed count
+Bucket = Tuple[str, float, float]
+
+
+def parse_timestamp(value: Optional[str]) -> float:
+    """
+    Convert a Supabase timestamptz string into epoch seconds, defaulting to now.
+    """
+    if not value:
+        return time.time()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return time.time()
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _log_add(a: float, b: float) -> float:
+    if a == -math.inf:
+        return b
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+class TrendingIndex:
+    """
+    Incrementally maintained ranking of responses by time-decayed engagement.
+
+    A response's score is the sum of its event weights, each decayed
+    exponentially since the event happened. Because every score decays at the
+    same rate, the ranking only changes when an event arrives, so we store each
+    score in log space relative to a fixed epoch and keep a sorted list of
+    (-score, id). Recording an event is O(log n) plus a list shift, and reading
+    the top k is an O(k) slice.
+    """
+
+    def __init__(self, half_life_hours: float = TRENDING_HALF_LIFE_HOURS, max_size: int = TRENDING_MAX_RESPONSES):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.max_size = max_size
+        self.epoch = time.time()
+        self.ready = False
+        self._scores: Dict[str, float] = {}
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._ranking: List[Tuple[float, str]] = []
+        # Events seen while a rebuild's query is in flight, replayed onto its result
+        self._journal: Optional[List[Tuple[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _log_weight(self, weight: float, at: float) -> float:
+        # Clock skew must not push events into the future
+        at = min(at, time.time())
+        return math.log(weight) + self.decay * (at - self.epoch)
+
+    def _set_score(self, response_id: str, score: float):
+        old = self._scores.get(response_id)
+        if old is not None:
+            index = bisect.bisect_left(self._ranking, (-old, response_id))
+            if index < len(self._ranking) and self._ranking[index][1] == response_id:
+                del self._ranking[index]
+        self._scores[response_id] = score
+        bisect.insort(self._ranking, (-score, response_id))
+
+    def _trim(self):
+        while len(self._ranking) > self.max_size:
+            _, response_id = self._ranking.pop()
+            self._scores.pop(response_id, None)
+            self._rows.pop(response_id, None)
+
+    def add_response(self, row: Dict[str, Any]):
+        if self._journal is not None:
+            self._journal.append(("response", row))
+        response_id = str(row["id"])
+        if response_id in self._rows:
+            self._rows[response_id] = row
+            return
+        self._rows[response_id] = row
+        created = parse_timestamp(row.get("created_at"))
+        self._set_score(response_id, self._log_weight(TRENDING_RESPONSE_WEIGHT, created))
+        self._trim()
+
+    def record(self, response_id: str, weight: float, at: Optional[float] = None):
+        """
+        Add an engagement event. Events for responses outside the index are
+        ignored; the next reconciliation picks them up if they are recent.
+        """
+        old = self._scores.get(response_id)
+        if old is None:
+            return
+        at = time.time() if at is None else at
+        self._set_score(response_id, _log_add(old, self._log_weight(weight, at)))
+
+    def record_upvote(self, response_id: str, count: int = 1, at: Optional[float] = None):
+        if count <= 0:
+            return
+        at = time.time() if at is None else at
+        if self._journal is not None:
+            self._journal.append(("upvote", (response_id, count, at)))
+        self.record(response_id, TRENDING_UPVOTE_WEIGHT * count, at)
+
+    def record_comment(self, response_id: str, at: Optional[float] = None):
+        at = time.time() if at is None else at
+        if self._journal is not None:
+            self._journal.append(("comment", (response_id, at)))
+        self.record(response_id, TRENDING_COMMENT_WEIGHT, at)
+
+    def top(self, k: int) -> List[Dict[str, Any]]:
+        now_offset = self.decay * (time.time() - self.epoch)
+        results = []
+        for neg_score, response_id in self._ranking[:k]:
+            row = dict(self._rows[response_id])
+            row["trending_score"] = round(math.exp(-neg_score - now_offset), 4)
+            results.append(row)
+        return results
+
+    def start_journal(self):
+        self._journal = []
+
+    def stop_journal(self):
+        self._journal = None
+
+    def rebuild(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        buckets: Sequence[Bucket] = (),
+        pending_upvotes: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Replace the index from Supabase rows that embed one `alias(count)` per
+        bucket, as built by engagement_query(). The epoch is moved to now to keep
+        scores well scaled.
+
+        Events journaled since start_journal() are replayed on top, and so are
+        `pending_upvotes`: upvotes that were still in the write buffer when the
+        journal started, which Supabase may not have seen yet.
+        """
+        self.epoch = time.time()
+        scores: Dict[str, float] = {}
+        kept_rows: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            row = dict(row)
+            response_id = str(row["id"])
+            score = self._log_weight(TRENDING_RESPONSE_WEIGHT, parse_timestamp(row.get("created_at")))
+            for alias, weight, at in buckets:
+                embedded = row.pop(alias, None) or [{}]
+                count = embedded[0].get("count") or 0
+                if count:
+                    score = _log_add(score, self._log_weight(weight * count, at))
+            scores[response_id] = score
+            kept_rows[response_id] = row
+        journal, self._journal = self._journal or [], None
+        self._scores = scores
+        self._rows = kept_rows
+        self._ranking = sorted((-score, response_id) for response_id, score in scores.items())
+        for kind, value in journal:
+            if kind == "response":
+                self.add_response(value)
+            elif kind == "upvote":
+                self.record_upvote(*value)
+            else:
+                self.record_comment(*value)
+        for response_id, count in (pending_upvotes or {}).items():
+            self.record_upvote(response_id, count)
+        self._trim()
+        self.ready = True
+
+
+def engagement_query(now: Optional[float] = None) -> Tuple[str, List[Tuple[str, str]], List[Bucket]]:
+    """
+    Select and filters that load each response's upvote and comment counts per age
+    bucket, e.g. `u2:upvotes(count)` with `u2.created_at` in [now-4h, now-2h).
+    Returns (select, filters, buckets).
+    """
+    now = time.time() if now is None else now
+    edges = [0, *TRENDING_BUCKET_HOURS, None]
+    select, filters, buckets = ["*"], [], []
+    for index, (low, high) in enumerate(zip(edges, edges[1:])):
+        middle = (low + high) / 2 if high is not None else low * 1.5
+        for prefix, table, weight in (("u", "upvotes", TRENDING_UPVOTE_WEIGHT), ("c", "comments", TRENDING_COMMENT_WEIGHT)):
+            alias = f"{prefix}{index}"
+            select.append(f"{alias}:{table}(count)")
+            if low:
+                filters.append((f"{alias}.created_at", f"lt.{_isoformat(now - low * 3600)}"))
+            if high is not None:
+                filters.append((f"{alias}.created_at", f"gte.{_isoformat(now - high * 3600)}"))
+            buckets.append((alias, weight, now - middle * 3600))
+    return ",".join(select), filters, buckets
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+async def reconcile(index: TrendingIndex, client, buffer=upvote_buffer) -> bool:
+    """
+    Rebuild the index from recent responses and their engagement counts in Supabase.
+    Only counts per age bucket are transferred, never the upvote or comment rows.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=TRENDING_WINDOW_DAYS)
+    select, filters, buckets = engagement_query()
+    params = [
+        ("select", select),
+        ("created_at", f"gte.{since.isoformat()}"),
+        ("order", "created_at.desc"),
+        ("limit", str(index.max_size)),
+        *filters,
+    ]
+    # Upvotes buffered before the read starts, plus the journal for everything
+    # after, so one flushed while the read is in flight is never missed. It may
+    # be counted twice instead, which only errs towards keeping it trending.
+    index.start_journal()
+    pending = buffer.pending_counts()
+    try:
+        res = await client.get("/responses", params=params)
+        if res.status_code != 200:
+            logger.warning("trending reconcile failed", extra={"status": res.status_code, "code": error_code(res)})
+            return False
+        index.rebuild(res.json(), buckets, pending)
+    finally:
+        index.stop_journal()
+    return True
+
+
+async def run_reconciler(index: TrendingIndex, client, interval: float = TRENDING_RECONCILE_SECONDS):
+    while True:
+        try:
+            await reconcile(index, client)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("trending reconcile error")
+        await asyncio.sleep(interval)
+
+
+trending = TrendingIndex()
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+from services.log import get_logger
+from supabase_client import SupabaseUnavailable, client as supabase, error_code
+
+logger = get_logger("upvotes")
+
+# Flush when this many distinct upvotes are pending, or after this many seconds
+UPVOTE_FLUSH_SIZE = int(os.getenv("UPVOTE_FLUSH_SIZE", "200"))
+UPVOTE_FLUSH_SECONDS = float(os.getenv("UPVOTE_FLUSH_SECONDS", "1.0"))
+# Unique columns used to ignore duplicate upvotes; empty to insert without on_conflict
+UPVOTE_ON_CONFLICT = os.getenv("UPVOTE_ON_CONFLICT", "response_id,user_id")
+# Upvotes held while Supabase is unavailable; beyond this new upvotes get a 503
+UPVOTE_MAX_PENDING = int(os.getenv("UPVOTE_MAX_PENDING", "20000"))
+# Backoff cap (seconds) between flushes while Supabase keeps failing
+UPVOTE_RETRY_MAX_DELAY = float(os.getenv("UPVOTE_RETRY_MAX_DELAY", "30"))
+# Flushes tried on shutdown before giving up on what is left
+UPVOTE_DRAIN_ATTEMPTS = 3
+# Statuses that blame the submitted rows, when PostgREST gives no error code
+_ROW_ERROR_STATUSES = (400, 409, 422)
+# PostgreSQL error classes for bad data (22xxx) and constraint violations (23xxx)
+_ROW_ERROR_CLASSES = ("22", "23")
+
+Key = Tuple[str, str]
+
+
+class UpvoteBuffer:
+    """
+    Write-behind queue for upvotes.
+
+    `add()` acknowledges immediately. Upvotes are deduplicated by
+    (response_id, user_id) and written to Supabase as one array insert when
+    the buffer reaches `flush_size` or every `flush_interval` seconds.
+    Pending upvotes are added to the counts the API reports until they are
+    written, and `stop()` drains everything still buffered.
+
+    An acknowledged upvote is only given up when Supabase rejects that row
+    itself (a constraint or data error): such a batch is split in halves until
+    the bad rows are isolated. Any other failure (5xx, 429, auth or schema
+    errors, transport errors, open breaker) keeps the whole batch buffered
+    and flushes back off exponentially; once `max_pending` upvotes are held, `add()` refuses new
+    ones with SupabaseUnavailable instead of accepting writes it may lose.
+    """
+
+    def __init__(
+        self,
+        client,
+        flush_size: int = UPVOTE_FLUSH_SIZE,
+        flush_interval: float = UPVOTE_FLUSH_SECONDS,
+        max_pending: int = UPVOTE_MAX_PENDING,
+    ):
+        self.client = client
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Key, None] = {}
+        self._counts: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Consecutive flushes that failed because Supabase was unavailable
+        self.failures = 0
+        self._retry_at = 0.0
+        self.flushed = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, response_id: str, user_id: str) -> bool:
+        """
+        Queue an upvote. Returns False if the same user's upvote is already pending.
+        """
+        key = (response_id, user_id)
+        if key in self._pending:
+            return False
+        if len(self._pending) >= self.max_pending:
+            raise SupabaseUnavailable("Upvote buffer is full", retry_after=max(1.0, self._retry_at - time.monotonic()))
+        self._pending[key] = None
+        self._counts[response_id] = self._counts.get(response_id, 0) + 1
+        if len(self._pending) >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def pending_count(self, response_id: str) -> int:
+        return self._counts.get(response_id, 0)
+
+    def pending_counts(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = list(self._pending), {}
+            # Chunks still to write; a chunk Supabase rejects is split until the bad rows are alone
+            chunks: List[List[Key]] = [batch]
+            written = 0
+            touched = set()
+            while chunks:
+                chunk = chunks.pop()
+                try:
+                    error = await self._insert(chunk)
+                except BaseException:
+                    # Cancelled mid-flush (e.g. by stop()); nothing unwritten is lost
+                    self._requeue([key for rest in (chunk, *chunks) for key in rest])
+                    raise
+                if error is None:
+                    for response_id, _ in chunk:
+                        self._release(response_id)
+                        touched.add(response_id)
+                    written += len(chunk)
+                elif not _is_row_error(error):
+                    # Supabase is unavailable or misconfigured (e.g. a wrong key or a
+                    # missing table); keep everything not yet written and back off
+                    self._requeue([key for rest in (chunk, *chunks) for key in rest])
+                    self._back_off(len(batch) - written, error)
+                    break
+                elif len(chunk) > 1:
+                    middle = len(chunk) // 2
+                    chunks += [chunk[middle:], chunk[:middle]]
+                else:
+                    logger.warning("upvote rejected", extra={"response_id": chunk[0][0], **error})
+                    self._release(chunk[0][0])
+                    self.dropped += 1
+            else:
+                self.failures = 0
+
+            if touched:
+                self.client.invalidate(*(f"response:{response_id}" for response_id in touched))
+            self.flushed += written
+            return written
+
+    async def _insert(self, rows: List[Key]) -> Optional[Dict]:
+        """
+        Insert rows in one statement; returns None on success, else what went wrong.
+        """
+        params = {"on_conflict": UPVOTE_ON_CONFLICT} if UPVOTE_ON_CONFLICT else None
+        prefer = "return=minimal"
+        if UPVOTE_ON_CONFLICT:
+            prefer = "resolution=ignore-duplicates,return=minimal"
+        try:
+            res = await self.client.post(
+                "/upvotes",
+                json=[{"response_id": r, "user_id": u} for r, u in rows],
+                params=params,
+                headers={"Prefer": prefer},
+            )
+        except Exception as e:
+            # SupabaseUnavailable or an unexpected error; either way the rows are kept
+            return {"error": type(e).__name__}
+        if res.status_code in (200, 201, 204):
+            return None
+        return {"status": res.status_code, "code": error_code(res)}
+
+    def _requeue(self, keys: List[Key]):
+        for key in keys:
+            if key in self._pending:
+                # Re-added while the flush was in flight; it is already counted once
+                self._release(key[0])
+            else:
+                self._pending[key] = None
+
+    def _back_off(self, pending: int, error: Dict):
+        self.failures += 1
+        delay = min(UPVOTE_RETRY_MAX_DELAY, self.flush_interval * 2 ** self.failures)
+        self._retry_at = time.monotonic() + random.uniform(delay / 2, delay)
+        logger.warning("upvote flush failed", extra={"pending": pending, "failures": self.failures, **error})
+
+    def _release(self, response_id: str):
+        remaining = self._counts.get(response_id, 0) - 1
+        if remaining > 0:
+            self._counts[response_id] = remaining
+        else:
+            self._counts.pop(response_id, None)
+
+    async def _run(self):
+        while True:
+            backoff = self._retry_at - time.monotonic()
+            if backoff > 0:
+                # Supabase is unavailable; a full buffer does not shorten the wait
+                await asyncio.sleep(backoff)
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("upvote flush error")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Drain whatever is still buffered before the client closes
+        for _ in range(UPVOTE_DRAIN_ATTEMPTS):
+            if not self._pending:
+                break
+            await self.flush()
+        if self._pending:
+            logger.error("upvotes lost on shutdown", extra={"pending": len(self._pending)})
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+
+def _is_row_error(error: Dict) -> bool:
+    """
+    Whether Supabase rejected the rows themselves, so that retrying them as they
+    are can never succeed. PostgREST's own codes (PGRST...) and SQL errors such
+    as 42P01 (undefined table) or 42501 (permission denied) are not.
+    """
+    code = error.get("code")
+    if code:
+        return code[:2] in _ROW_ERROR_CLASSES
+    return error.get("status") in _ROW_ERROR_STATUSES
+
+
+upvote_buffer = UpvoteBuffer(supabase)
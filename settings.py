@@ -0,0 +1,36 @@
+from pathlib import Path
+from typing import Mapping, Optional
+from dotenv import load_dotenv
+import os
+
+# Load the .env file from root
+env_path = Path(__file__).resolve().parents[0] / ".env"
+load_dotenv(dotenv_path=env_path)
+
+
+def _flag(value: Optional[str]) -> bool:
+    return (value or "").lower() in ("1", "true", "yes")
+
+
+class Settings:
+    """
+    Provider credentials and startup behavior, read once from the environment.
+
+    Nothing here talks to a provider: the Supabase client is opened in the
+    app lifespan and the Gemini SDK is imported on the first AI call, so a
+    missing GEMINI_API_KEY only affects the AI routes.
+    """
+
+    def __init__(self, env: Mapping[str, str] = os.environ):
+        self.supabase_url = env.get("SUPABASE_URL")
+        self.supabase_service_key = env.get("SUPABASE_SERVICE_KEY")
+        self.gemini_api_key = env.get("GEMINI_API_KEY")
+        # Import the Gemini SDK and build its models during startup instead of on first use
+        self.ai_eager_startup = _flag(env.get("AI_EAGER_STARTUP"))
+
+    @property
+    def ai_configured(self) -> bool:
+        return bool(self.gemini_api_key)
+
+
+settings = Settings()
@@ -109,8 +109,8 @@ const Home: React.FC = () => {
         const data = await response.json();
         console.log('Fetched questions from backend:', data);
         
-        // Map backend data to Post shape
-        const mapped = data.map((q: any) => ({
+        // Map backend data to Post shape (the list is paginated: { items, next_cursor })
+        const mapped = data.items.map((q: any) => ({
           id: q.id,
           content: q.content,
           hearts: q.hearts || 0,
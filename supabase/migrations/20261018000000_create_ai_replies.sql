@@ -0,0 +1,8 @@
+-- Pre-generated AI replies, one per question, kept apart from user responses.
+-- The thread view embeds them through the foreign key on question_id.
+create table if not exists ai_replies (
+  question_id uuid primary key references questions (id) on delete cascade,
+  content text not null,
+  tone text,
+  created_at timestamptz not null default now()
+);
@@ -1,28 +1,311 @@
-from pathlib import Path
-from dotenv import load_dotenv
+from typing import Iterable, Optional
+from urllib.parse import urlencode
+import asyncio
+import importlib.util
 import os
+import time
 import httpx
+from services.cache import TTLCache
+from services.metrics import supabase_request_duration, supabase_requests
+from services.resilience import OPEN, CircuitBreaker, backoff_delays
+from settings import settings
 
-# Load the .env file from root
+# Connection pool and timeout tuning for the PostgREST upstream
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_POOL_TIMEOUT = float(os.getenv("SUPABASE_POOL_TIMEOUT", "5"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "false").lower() in ("1", "true", "yes")
+# Per-operation read timeouts: reads fail fast since they can be retried,
+# writes get longer since they cannot
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "5"))
+SUPABASE_WRITE_TIMEOUT = float(os.getenv("SUPABASE_WRITE_TIMEOUT", str(SUPABASE_TIMEOUT)))
 
-env_path = Path(__file__).resolve().parents[0] / ".env"
-load_dotenv(dotenv_path=env_path)
+# Retries for idempotent reads (GET/HEAD) on connection errors and 502/503/504
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "2"))
+SUPABASE_RETRY_BASE_DELAY = float(os.getenv("SUPABASE_RETRY_BASE_DELAY", "0.05"))
+SUPABASE_RETRY_MAX_DELAY = float(os.getenv("SUPABASE_RETRY_MAX_DELAY", "0.5"))
 
+# Circuit breaker: open after this many consecutive failures, probe again after the cool-off
+SUPABASE_BREAKER_FAILURES = int(os.getenv("SUPABASE_BREAKER_FAILURES", "5"))
+SUPABASE_BREAKER_RESET_SECONDS = float(os.getenv("SUPABASE_BREAKER_RESET_SECONDS", "15"))
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+# Read-through cache for hot PostgREST reads
+SUPABASE_CACHE_MAX_ENTRIES = int(os.getenv("SUPABASE_CACHE_MAX_ENTRIES", "5000"))
+SUPABASE_CACHE_MAX_BYTES = int(os.getenv("SUPABASE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
 
-print("SUPABASE_URL =", SUPABASE_URL)
-print("SUPABASE_SERVICE_KEY is loaded?", SUPABASE_SERVICE_KEY is not None)
+# Response headers worth keeping on cached entries
+_CACHED_HEADERS = ("content-type", "content-range")
 
-client = httpx.Client(
-    base_url=f"{SUPABASE_URL}/rest/v1",
-    headers={
-        "apikey": SUPABASE_SERVICE_KEY,
-        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=representation"  # ✅ THIS IS CRITICAL
-    }
-)
+_IDEMPOTENT_METHODS = ("GET", "HEAD")
+# Upstream statuses that mean Supabase itself is unwell, as opposed to a bad request
+_FAILURE_STATUSES = {500, 502, 503, 504}
+_RETRYABLE_STATUSES = {502, 503, 504}
+# Timeouts are not retried: a retry would double the wait while Supabase is slow
+_RETRYABLE_ERRORS = (httpx.NetworkError, httpx.RemoteProtocolError)
 
+_READ_TIMEOUT = httpx.Timeout(SUPABASE_READ_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT, pool=SUPABASE_POOL_TIMEOUT)
+_WRITE_TIMEOUT = httpx.Timeout(SUPABASE_WRITE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT, pool=SUPABASE_POOL_TIMEOUT)
 
+
+class SupabaseUnavailable(Exception):
+    """
+    Raised when Supabase cannot be reached, or while the circuit breaker is open.
+    The app turns it into a 503 with a Retry-After header and `detail`.
+    """
+
+    detail = "The database is unavailable right now. Please try again shortly."
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SupabaseClient:
+    """
+    Async data-access client for the Supabase PostgREST API.
+
+    One pooled httpx.AsyncClient is shared by every request. It is opened and
+    closed by the FastAPI lifespan in main.py, so routes can simply
+    `await client.get(...)` without tying up a worker thread.
+
+    GETs can opt into the in-process cache with `cache_ttl` and `cache_tags`;
+    writes call `invalidate()` with the tags they affect.
+
+    Every request has a per-operation timeout and goes through a circuit
+    breaker, so a degraded Supabase costs one timeout per request until the
+    breaker opens, and then nothing. Reads are retried with jittered backoff;
+    writes are not, since PostgREST inserts are not idempotent.
+    """
+
+    def __init__(self):
+        self._http: Optional[httpx.AsyncClient] = None
+        self.cache = TTLCache(
+            max_entries=SUPABASE_CACHE_MAX_ENTRIES,
+            max_size=SUPABASE_CACHE_MAX_BYTES,
+        )
+        self.breaker = CircuitBreaker(
+            "supabase",
+            failure_threshold=SUPABASE_BREAKER_FAILURES,
+            reset_timeout=SUPABASE_BREAKER_RESET_SECONDS,
+        )
+        self.retries = 0
+
+    async def open(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        if self._http is not None:
+            return
+        # HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 without it
+        http2 = SUPABASE_HTTP2 and importlib.util.find_spec("h2") is not None
+        self._http = httpx.AsyncClient(
+            base_url=f"{settings.supabase_url}/rest/v1",
+            headers={
+                "apikey": settings.supabase_service_key or "",
+                "Authorization": f"Bearer {settings.supabase_service_key}",
+                "Content-Type": "application/json",
+                "Prefer": "return=representation"  # ✅ THIS IS CRITICAL
+            },
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+                keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                SUPABASE_TIMEOUT,
+                connect=SUPABASE_CONNECT_TIMEOUT,
+                pool=SUPABASE_POOL_TIMEOUT,
+            ),
+            http2=http2,
+            transport=transport,
+        )
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            raise RuntimeError("Supabase client is not open. It is opened in the app lifespan.")
+        return self._http
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send one logical request: breaker check, per-operation timeout, and
+        retries for reads. Raises SupabaseUnavailable instead of transport errors.
+        The breaker hears one outcome per logical request, not per attempt.
+        """
+        idempotent = method in _IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", _READ_TIMEOUT if idempotent else _WRITE_TIMEOUT)
+        table = table_name(url)
+        allowed, probe = self.breaker.allow()
+        if not allowed:
+            raise self._circuit_open(method, table)
+        try:
+            res = await self._send_with_retries(method, url, table, idempotent, probe, **kwargs)
+        except httpx.TransportError as e:
+            self.breaker.record_failure(probe)
+            raise SupabaseUnavailable(f"Supabase request failed: {type(e).__name__}") from e
+        except BaseException:
+            # Cancelled, or a bug on our side; says nothing about Supabase
+            if probe:
+                self.breaker.release()
+            raise
+        if res.status_code in _FAILURE_STATUSES:
+            self.breaker.record_failure(probe)
+        else:
+            self.breaker.record_success(probe)
+        return res
+
+    async def _send_with_retries(
+        self, method: str, url: str, table: str, idempotent: bool, probe: bool, **kwargs
+    ) -> httpx.Response:
+        delays = backoff_delays(SUPABASE_MAX_RETRIES if idempotent else 0, SUPABASE_RETRY_BASE_DELAY, SUPABASE_RETRY_MAX_DELAY)
+        while True:
+            try:
+                res = await self._send(method, url, table, **kwargs)
+            except _RETRYABLE_ERRORS:
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+            else:
+                delay = next(delays, None) if res.status_code in _RETRYABLE_STATUSES else None
+                if delay is None:
+                    return res
+            self.retries += 1
+            await asyncio.sleep(delay)
+            # Other requests may have opened the breaker meanwhile; the probe
+            # keeps its slot until it has a verdict
+            if not probe and self.breaker.state == OPEN:
+                raise self._circuit_open(method, table)
+
+    def _circuit_open(self, method: str, table: str) -> SupabaseUnavailable:
+        supabase_requests.labels(method, table, "circuit_open").inc()
+        return SupabaseUnavailable("Supabase circuit breaker is open", retry_after=self.breaker.retry_after())
+
+    async def _send(self, method: str, url: str, table: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            res = await self.http.request(method, url, **kwargs)
+        except Exception as e:
+            supabase_requests.labels(method, table, type(e).__name__).inc()
+            raise
+        finally:
+            supabase_request_duration.labels(method, table).observe(time.perf_counter() - start)
+        supabase_requests.labels(method, table, str(res.status_code)).inc()
+        return res
+
+    async def get(
+        self,
+        url: str,
+        cache_ttl: float = 0,
+        cache_tags: Iterable[str] = (),
+        **kwargs,
+    ) -> httpx.Response:
+        return await self._cached_request("GET", url, cache_ttl, cache_tags, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("HEAD", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def _cached_request(
+        self,
+        method: str,
+        url: str,
+        cache_ttl: float,
+        cache_tags: Iterable[str],
+        **kwargs,
+    ) -> httpx.Response:
+        if not cache_ttl:
+            return await self.request(method, url, **kwargs)
+
+        key = self.cache_key(method, url, kwargs.get("params"), kwargs.get("headers"))
+        cached = self.cache.get(key)
+        if cached is not None:
+            status_code, headers, content = cached
+            return httpx.Response(status_code, headers=headers, content=content)
+
+        res = await self.request(method, url, **kwargs)
+        if res.status_code in (200, 206):
+            headers = {name: res.headers[name] for name in _CACHED_HEADERS if name in res.headers}
+            self.cache.set(
+                key,
+                (res.status_code, headers, res.content),
+                ttl=cache_ttl,
+                size=len(res.content) + 64,
+                tags=cache_tags,
+            )
+        return res
+
+    def cache_key(self, method: str, url: str, params=None, headers=None) -> str:
+        """
+        Normalize a PostgREST query into a cache key: path plus sorted query parameters,
+        plus any per-request headers that change the representation.
+        """
+        request_url = self.http.build_request("GET", url, params=params).url
+        query = urlencode(sorted(request_url.params.multi_items()))
+        key = f"{method} {request_url.path}?{query}"
+        if headers:
+            key += "|" + urlencode(sorted((k.lower(), v) for k, v in dict(headers).items()))
+        return key
+
+    def invalidate(self, *tags: str) -> int:
+        return self.cache.invalidate(*tags)
+
+    def health(self):
+        return {**self.breaker.stats(), "retries": self.retries}
+
+    async def count(
+        self,
+        url: str,
+        cache_ttl: float = 0,
+        cache_tags: Iterable[str] = (),
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Count matching rows upstream with a HEAD request; no rows are transferred.
+        Read the result with total_count().
+        """
+        headers = {**kwargs.pop("headers", {}), "Prefer": "count=exact"}
+        return await self._cached_request("HEAD", url, cache_ttl, cache_tags, headers=headers, **kwargs)
+
+
+def table_name(url: str) -> str:
+    """
+    The PostgREST table a request URL targets, e.g. `/questions?id=eq.1` -> `questions`.
+    """
+    return url.partition("?")[0].strip("/").partition("/")[0] or "unknown"
+
+
+def error_code(res: httpx.Response) -> Optional[str]:
+    """
+    PostgREST's error code (e.g. `23505`) for logging. The message and details are
+    left out, since they can quote the submitted row.
+    """
+    try:
+        body = res.json()
+    except ValueError:
+        return None
+    return body.get("code") if isinstance(body, dict) else None
+
+
+def total_count(res: httpx.Response) -> Optional[int]:
+    """
+    Parse the total from a PostgREST Content-Range header such as `0-24/3573` or `*/0`.
+    """
+    content_range = res.headers.get("content-range", "")
+    total = content_range.rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+client = SupabaseClient()